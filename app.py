@@ -1,7 +1,15 @@
+import os
 import dash
+import diskcache
 import dash_bootstrap_components as dbc
+from dash import DiskcacheManager
 from layout import layout
-from callbacks import register_callbacks
+from callbacks import data, register_callbacks
+from metrics import init_metrics
+from utils import CACHE_DIR
+
+# Background callbacks (chart export, supply simulator) run outside the request thread, tracked in a local disk cache
+background_callback_manager = DiskcacheManager(diskcache.Cache(os.path.join(CACHE_DIR, "background")))
 
 # Initialize Dash app with both Flatly (light) and Darkly (dark) themes
 app = dash.Dash(    
@@ -10,11 +18,15 @@ app = dash.Dash(
         dbc.themes.FLATLY,  # Light theme
         dbc.themes.DARKLY,  # Dark theme
         "https://use.fontawesome.com/releases/v5.15.4/css/all.css"
-    ]
+    ],
+    background_callback_manager=background_callback_manager
 )
 
 app.layout = layout
 register_callbacks(app)
+# Opt-in via DASHBOARD_METRICS=1; serves /metrics and /metrics/profile
+init_metrics(app.server)
 
 if __name__ == '__main__':
+    data.watch()
     app.run_server(debug=True)
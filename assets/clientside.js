@@ -0,0 +1,24 @@
+// Pure UI state, handled in the browser so these never take a server worker
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ui: {
+        // Runs once per page load; the server coalesces slider requests per page id
+        newPageId: function () {
+            if (window.crypto && window.crypto.randomUUID) {
+                return window.crypto.randomUUID();
+            }
+            return Date.now().toString(36) + Math.random().toString(36).slice(2);
+        },
+        toggleDarkMode: function (darkMode) {
+            return darkMode ? "dashboard dark-mode" : "dashboard";
+        },
+        toggleSidebar: function (toggleClicks, isOpen) {
+            return !isOpen;
+        },
+        toggleModal: function (openClicks, closeClicks, isOpen) {
+            if (openClicks || closeClicks) {
+                return !isOpen;
+            }
+            return isOpen;
+        }
+    }
+});
@@ -0,0 +1,196 @@
+"""Benchmark the dashboard's data and callback hot paths on synthetic datasets.
+
+    python benchmark.py --sizes 100,1000,10000 --output bench.json
+    python benchmark.py --compare bench.json
+
+Results are JSON so runs from different commits can be diffed; ``--compare``
+exits non-zero when a stage got slower than ``--threshold`` times the baseline.
+"""
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import export
+import metrics
+import store as store_module
+import utils
+from utils import BLOOD_GROUPS, DATA_FILE
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_REPEATS = 3
+BENCH_CONTINENT = "Europe"
+BENCH_BLOOD_TYPES = ("O+", "A-")
+# Module-level paths copied from utils.CACHE_DIR at import: (module, attribute, subdirectory)
+CACHE_PATHS = [(utils, "CACHE_DIR", ""), (store_module, "CACHE_DIR", ""), (export, "EXPORT_DIR", "exports"),
+               (metrics, "PROFILE_DIR", "profiles")]
+
+
+def synthetic_dataset(rows, seed=0):
+    """A frame in the processed_blood_type_data_with_continent.csv schema with ``rows`` rows.
+
+    Country names cycle through the real ones so continent tagging and the
+    choropleth see realistic names, and each row is a distinct region of its
+    country; percentages are drawn around each real country's distribution
+    and always sum to 100.
+    """
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(DATA_FILE)
+    source = base.iloc[np.arange(rows) % len(base)].reset_index(drop=True)
+
+    # Row-wise Dirichlet draws, via normalized gammas
+    draws = rng.gamma(source[BLOOD_GROUPS].to_numpy() + 1.0)
+    shares = draws / draws.sum(axis=1, keepdims=True)
+    df = pd.DataFrame({"Region": source["Country"] + " " + (np.arange(rows) // len(base) + 1).astype(str),
+                       "Country": source["Country"]})
+    df["Population"] = np.round(rng.lognormal(np.log(1e7), 1.5, rows))
+    df[BLOOD_GROUPS] = np.round(shares * 100, 2)
+    df["Continent"] = source["Continent"]
+    df["Rarest_Blood_Type"] = np.asarray(BLOOD_GROUPS)[shares.argmin(axis=1)]
+    df["Diversity_Index"] = -(shares * np.log(shares)).sum(axis=1)
+    return df
+
+
+def time_stage(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {"min_s": min(timings), "median_s": float(np.median(timings)), "repeats": repeats}
+
+
+@contextlib.contextmanager
+def redirected_caches(cache_dir):
+    """Point every module's cache path into ``cache_dir``, so nothing is written under the real Data/.cache."""
+    originals = [getattr(module, attr) for module, attr, _ in CACHE_PATHS]
+    for module, attr, subdir in CACHE_PATHS:
+        setattr(module, attr, os.path.join(cache_dir, subdir))
+    try:
+        yield
+    finally:
+        for (module, attr, _), original in zip(CACHE_PATHS, originals):
+            setattr(module, attr, original)
+
+
+def bench_size(rows, repeats, workdir):
+    # Imported here, inside redirected_caches: importing callbacks loads the real dataset into a store
+    import callbacks
+    import dataset
+
+    csv_path = os.path.join(workdir, f"synthetic_{rows}.csv")
+    synthetic_dataset(rows).to_csv(csv_path, index=False)
+    uncached_load = inspect.unwrap(utils.load_and_preprocess_data)
+
+    def load_cold():
+        shutil.rmtree(utils.CACHE_DIR, ignore_errors=True)
+        uncached_load(csv_path)
+
+    results = {"load_cold": time_stage(load_cold, repeats)}
+    results["load_warm"] = time_stage(lambda: uncached_load(csv_path), repeats)
+
+    store = store_module.BloodTypeStore.from_frame(uncached_load(csv_path))
+    results["index_build"] = time_stage(lambda: utils.build_aggregate_index(store), repeats)
+
+    # Point the figure builders at the synthetic data and bypass their caches
+    callbacks.data.snapshot = dataset.build_snapshot(store, "benchmark")
+    continent_index = callbacks.data.snapshot.aggregate_index[BENCH_CONTINENT]
+    pop_cap = float(np.median(store.population))
+
+    def build(builder, *key):
+        return lambda: inspect.unwrap(builder)(callbacks.data.snapshot, None, BENCH_CONTINENT, pop_cap, *key)
+
+    stages = {
+        "filter": lambda: continent_index.rows(pop_cap),
+        "choropleth": build(callbacks.choropleth_figure, BENCH_BLOOD_TYPES[0]),
+        "pie": build(callbacks.pie_figure, BENCH_BLOOD_TYPES),
+        "bar": build(callbacks.bar_figure, BENCH_BLOOD_TYPES),
+        "gauge": build(callbacks.gauge_figure),
+        "scatter": build(callbacks.scatter_figure, BENCH_BLOOD_TYPES[0]),
+        "heatmap": build(callbacks.heatmap_figure),
+        "table": lambda: utils.query_table(continent_index.rows(pop_cap), 0, 5, [], ""),
+        "download_csv": lambda: b"".join(export.iter_csv(store, np.arange(len(store)), export.data_export_columns([]))),
+    }
+    for stage, fn in stages.items():
+        results[stage] = time_stage(fn, repeats)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, repeats):
+    workdir = tempfile.mkdtemp(prefix="blood-bench-")
+    try:
+        results = []
+        with redirected_caches(os.path.join(workdir, "cache")):
+            for rows in sizes:
+                for stage, timing in bench_size(rows, repeats, workdir).items():
+                    results.append({"rows": rows, "stage": stage, **timing})
+                    print(f"{rows:>9} rows  {stage:<13} {timing['median_s'] * 1e3:10.2f} ms", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print per-stage median ratios against ``baseline``; return the regressed (rows, stage) pairs."""
+    previous = {(r["rows"], r["stage"]): r["median_s"] for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        key = (r["rows"], r["stage"])
+        if key not in previous or previous[key] == 0:
+            continue
+        ratio = r["median_s"] / previous[key]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{r['rows']:>9} rows  {r['stage']:<13} {ratio:6.2f}x{flag}", file=sys.stderr)
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard's data and callback hot paths")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="comma-separated row counts")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    report = run([int(s) for s in args.sizes.split(",")], args.repeats)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f), args.threshold):
+                sys.exit(1)
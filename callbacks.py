@@ -1,212 +1,367 @@
 import dash
-from dash.dependencies import Input, Output, State
+from dash.dependencies import ALL, ClientsideFunction, Input, Output, State
 import plotly.express as px
 import plotly.graph_objects as go
-from utils import load_and_preprocess_data, BLOOD_GROUPS
+from utils import query_table, BLOOD_GROUPS
+from dataset import DataManager
+from compatibility import compatibility_summary, continent_eligible_donors
+from simulation import Scenario, simulate_shortages
+from geo import continent_geometry
+from tiers import MAX_LEGEND_ITEMS, aggregate_tier, pick_tier, top_n_with_other
+from figures import figure_cache, figure_payload, record_payload
+from metrics import register_cache, timer
+from coalesce import SUPERSEDED, Coalescer, page_key
+from export import export_charts, register_data_export_route, DATA_EXPORT_ROUTE
+from urllib.parse import urlencode
+import itertools
+import numpy as np
 import logging
-from plotly.io import to_image
-from dash import dcc
-from layout import DARK_MODE_STYLE, LIGHT_MODE_STYLE, CARD_STYLE_DARK, CARD_STYLE_LIGHT, DATATABLE_STYLE_DARK, DATATABLE_STYLE_LIGHT, TOGGLE_LABEL_DARK, TOGGLE_LABEL_LIGHT
+from dash import dcc, html, ctx
+from layout import CHART_IDS, DEFAULT_BLOOD_TYPES, DEFAULT_CONTINENT, DEFAULT_POPULATION
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load data
-df = load_and_preprocess_data()
+# Load data; callbacks read data.snapshot once per call, so a hot reload can swap it underneath them
+data = DataManager()
+
+# Bounded so that long sessions with many slider positions can't grow memory without limit
+FIGURE_CACHE_SIZE = 256
+# Slider stops per continent, and how many of them get a label
+MAX_SLIDER_MARKS = 200
+LABELLED_SLIDER_MARKS = 5
+
+# Slider requests of one page for one chart run one at a time, newest wins
+coalescer = Coalescer()
+
+
+# Figure builders return a FigurePayload and are memoized on the filter state they actually depend on,
+# plus the continent's content version so a data reload only misses for continents that changed.
+# They read rows only from the snapshot they're passed, the one the version was taken from, which isn't part of the key.
+# pop_value is always snapped to a distinct population, so every slider position with the same rows shares an entry
+@figure_cache(maxsize=FIGURE_CACHE_SIZE)
+def choropleth_figure(snapshot, continent_version, selected_continent, pop_value, selected_blood_type):
+    continent_index = snapshot.aggregate_index[selected_continent]
+    store = continent_index.store
+    # Locations are ISO-3 codes, so sub-national rows are drawn at the country tier
+    df_continent = aggregate_tier(store, continent_index.row_positions(pop_value), "Country")
+    df_continent = df_continent[df_continent["ISO3"].fillna("") != ""]
+    # Geometry and bounds cover the whole continent, so they're shared by every filter state
+    geojson, (lon_min, lon_max, lat_min, lat_max) = continent_geometry(
+        selected_continent, tuple(sorted({code for code in store.decode("ISO3", continent_index.positions) if code})))
+    location_args = dict(geojson=geojson, featureidkey="id") if geojson else dict(locationmode="ISO-3")
+    fig_map = px.choropleth(df_continent, locations="ISO3", color=selected_blood_type, hover_name="Country",
+                            hover_data=BLOOD_GROUPS + ["Population", "Rarest_Blood_Type", "Diversity_Index"],
+                            color_continuous_scale="Reds", title=f"Global Distribution of {selected_blood_type} in {selected_continent}",
+                            **location_args)
+    fig_map.update_geos(lonaxis_range=[lon_min, lon_max], lataxis_range=[lat_min, lat_max], visible=True,
+                        showcountries=True, countrycolor="Black", showcoastlines=True, coastlinecolor="Black")
+    return figure_payload(fig_map, 'choropleth')
+
+
+@figure_cache(maxsize=FIGURE_CACHE_SIZE)
+def pie_figure(snapshot, continent_version, selected_continent, pop_value, multi_blood_types):
+    continent_index = snapshot.aggregate_index[selected_continent]
+    # Population-weighted, i.e. the share of all people in the matching countries
+    pie_data = continent_index.means(pop_value)[list(multi_blood_types)].reset_index().rename(columns={'index': 'BloodType', 0: 'MeanValue'})
+    fig_pie = px.pie(pie_data, values='MeanValue', names='BloodType',
+                     title=f"Blood Type Distribution in {selected_continent} (diversity {continent_index.diversity(pop_value):.2f})")
+    fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+    return figure_payload(fig_pie, 'pie')
+
+
+@figure_cache(maxsize=FIGURE_CACHE_SIZE)
+def bar_figure(snapshot, continent_version, selected_continent, pop_value, multi_blood_types):
+    continent_index = snapshot.aggregate_index[selected_continent]
+    positions = continent_index.row_positions(pop_value)
+    tier = pick_tier(continent_index.store, positions)
+    df_bars = top_n_with_other(aggregate_tier(continent_index.store, positions, tier), tier)
+    # Wide-form bar avoids materializing a melted copy of the rows
+    fig_bar = px.bar(df_bars, x=tier, y=list(multi_blood_types), barmode='group', opacity=0.9,
+                     labels={'variable': 'BloodType', 'value': 'Percentage'}, title=f"{', '.join(multi_blood_types)} Distribution in {selected_continent}")
+    return figure_payload(fig_bar, 'bar')
+
+
+@figure_cache(maxsize=FIGURE_CACHE_SIZE)
+def gauge_figure(snapshot, continent_version, selected_continent, pop_value):
+    continent_index = snapshot.aggregate_index[selected_continent]
+    store = continent_index.store
+    rarest_blood, rarest_percentage = continent_index.rarest(pop_value)
+    world = store.find_country('World')
+    global_rarest = store.percentage(world, rarest_blood) if world is not None else rarest_percentage
+    fig_gauge = go.Figure(go.Indicator(mode="gauge+number+delta", value=rarest_percentage, delta={'reference': global_rarest, 'increasing': {'color': "red"}},
+                                      ))
+    fig_gauge.update_layout(title=f"Rarest Blood Type in {selected_continent}: {rarest_blood}")
+    return figure_payload(fig_gauge, 'gauge')
+
+
+@figure_cache(maxsize=FIGURE_CACHE_SIZE)
+def scatter_figure(snapshot, continent_version, selected_continent, pop_value, selected_blood_type):
+    continent_index = snapshot.aggregate_index[selected_continent]
+    positions = continent_index.row_positions(pop_value)
+    tier = pick_tier(continent_index.store, positions)
+    df_points = aggregate_tier(continent_index.store, positions, tier)
+    # One trace per country; past MAX_LEGEND_ITEMS countries the points share a single trace
+    color = "Country" if "Country" in df_points and df_points["Country"].nunique() <= MAX_LEGEND_ITEMS else None
+    fig_scatter = px.scatter(df_points, x="Population", y=selected_blood_type, color=color, size="Population", hover_name=tier,
+                             hover_data=["Rarest_Blood_Type", "Diversity_Index"], log_x=True, title=f"{selected_blood_type} vs Population in {selected_continent}")
+    return figure_payload(fig_scatter, 'scatter')
+
+
+@figure_cache(maxsize=FIGURE_CACHE_SIZE)
+def heatmap_figure(snapshot, continent_version, selected_continent, pop_value):
+    correlation_matrix = snapshot.aggregate_index[selected_continent].corr(pop_value)
+    fig_heatmap = px.imshow(correlation_matrix, text_auto=True, aspect="auto", color_continuous_scale="RdBu", title=f"Blood Type Correlations in {selected_continent}")
+    return figure_payload(fig_heatmap, 'heatmap')
+
+
+@figure_cache(maxsize=FIGURE_CACHE_SIZE)
+def compatibility_figure(snapshot, continent_version, selected_continent, pop_value):
+    summary = compatibility_summary(snapshot.aggregate_index[selected_continent].donor_pools(pop_value))
+    fig_compat = go.Figure([
+        go.Bar(x=BLOOD_GROUPS, y=summary['Population'], name="People with this type"),
+        go.Bar(x=BLOOD_GROUPS, y=summary['Eligible_Donors'], name="Compatible donors for this type"),
+        go.Bar(x=BLOOD_GROUPS, y=summary['Eligible_Recipients'], name="Recipients this type can supply"),
+    ])
+    fig_compat.update_layout(title=f"Donor Compatibility in {selected_continent}")
+    return figure_payload(fig_compat, 'compatibility')
+
+
+# Keyed on the dataset version: the simulation runs over every continent at once
+@figure_cache(maxsize=FIGURE_CACHE_SIZE)
+def shortage_figure(snapshot, dataset_version, scenario, n_sims):
+    shortages = simulate_shortages(snapshot.store, scenario, n_sims)
+    fig_shortage = px.imshow(shortages, text_auto=".1%", aspect="auto", color_continuous_scale="Reds", zmin=0, zmax=1,
+                             labels={'x': 'Recipient', 'y': 'Continent', 'color': 'Probability'},
+                             title=f"Shortage Probability by Continent ({n_sims:,} simulations)")
+    return figure_payload(fig_shortage, 'shortage')
+
+
+FIGURE_BUILDERS = [choropleth_figure, pie_figure, bar_figure, gauge_figure, scatter_figure, heatmap_figure, compatibility_figure,
+                   shortage_figure]
+for builder in FIGURE_BUILDERS:
+    register_cache(builder.__name__, builder.cache_info)
+
+
+def warm_figure_caches(blood_types=DEFAULT_BLOOD_TYPES, continents=None, snapshot=None):
+    """Build every chart for ``continents`` (default: all) and ``blood_types`` at the initial and reset slider values."""
+    snapshot = snapshot or data.snapshot
+    blood_types = tuple(blood_types)
+    continents = snapshot.aggregate_index if continents is None else continents
+    for continent, pop_value in itertools.product(continents, {DEFAULT_POPULATION, snapshot.store.max_population()}):
+        pop_value = snapshot.aggregate_index[continent].snap(pop_value)
+        for builder, *key in [(choropleth_figure, blood_types[0]), (pie_figure, blood_types), (bar_figure, blood_types),
+                              (gauge_figure,), (scatter_figure, blood_types[0]), (heatmap_figure,), (compatibility_figure,)]:
+            try:
+                builder(snapshot, snapshot.continent_versions[continent], continent, pop_value, *key)
+            except Exception as e:
+                logger.warning(f"Could not warm {builder.__name__} for {continent}: {e}")
+
+
+# Rebuild the default charts of continents whose rows changed, before users ask for them
+data.subscribe(lambda snapshot, changed: warm_figure_caches(continents=changed, snapshot=snapshot))
+
+
+def only_slider_changed():
+    # Only then is the client still showing this chart for the same continent and blood types
+    return set(ctx.triggered_prop_ids) == {'population-slider.value'}
+
+
+def cached_figure(builder, page_id, selected_continent, pop_value, *key):
+    def build(full):
+        snapshot = data.snapshot
+        pop_cap = snapshot.aggregate_index[selected_continent].snap(pop_value)
+        with timer("dashboard_figure_duration_seconds", figure=builder.__name__):
+            payload = builder(snapshot, snapshot.continent_versions[selected_continent], selected_continent, pop_cap, *key)
+        record_payload(payload, not full)
+        return payload.figure if full else payload.patch
+
+    try:
+        figure = coalescer.run(page_key(page_id, builder.__name__), build, full=not only_slider_changed())
+    except Exception as e:
+        logger.error(f"Error in {builder.__name__}: {str(e)}")
+        return dash.no_update
+    return dash.no_update if figure is SUPERSEDED else figure
+
 
 def register_callbacks(app):
+    filter_inputs = [Input('continent-dropdown', 'value'), Input('population-slider', 'value')]
+    page_state = [State('page-id', 'data')]
+
     @app.callback(
         [
-            Output('choropleth-map', 'figure'),
-            Output('pie-chart', 'figure'),
-            Output('bar-chart', 'figure'),
-            Output('gauge-chart', 'figure'),
-            Output('scatter-plot', 'figure'),
-            Output('heatmap', 'figure'),
-            Output('data-table', 'data'),
-            Output('loading-message', 'children')
+            Output('blood-types-multi', 'value'),
+            Output('continent-dropdown', 'value'),
+            Output('population-slider', 'value')
         ],
-        [
-            Input('blood-types-multi', 'value'),
-            Input('continent-dropdown', 'value'),
-            Input('population-slider', 'value'),
-            Input('reset-filters', 'n_clicks')
-        ]
+        Input('reset-filters', 'n_clicks'),
+        prevent_initial_call=True
     )
-    def update_all_charts(multi_blood_types, selected_continent, pop_value, reset_n):
-        if reset_n:
-            multi_blood_types = ['O+']
-            selected_continent = 'Europe'
-            pop_value = df['Population'].max()
+    def reset_filters(reset_n):
+        return DEFAULT_BLOOD_TYPES, DEFAULT_CONTINENT, data.snapshot.aggregate_index[DEFAULT_CONTINENT].snap(data.snapshot.store.max_population())
 
+    @app.callback(
+        [Output('population-slider', 'min'), Output('population-slider', 'max'), Output('population-slider', 'marks')],
+        Input('continent-dropdown', 'value')
+    )
+    def update_slider_marks(selected_continent):
+        # Only a continent's distinct populations change which rows match, so they are the only stops
         try:
-            df_filtered = df[df['Population'] <= pop_value]
-            df_continent = df_filtered[df_filtered["Continent"] == selected_continent]
-            selected_blood_type = multi_blood_types[0]  # Use first for single-type charts
-
-            # Choropleth Map
-            fig_map = px.choropleth(df_continent, locations="Country", locationmode="country names", color=selected_blood_type,
-                                    hover_data=BLOOD_GROUPS + ["Population", "Rarest_Blood_Type", "Diversity_Index"],
-                                    color_continuous_scale="Reds")
-            fig_map.update_geos(fitbounds="locations", visible=True, showcountries=True, countrycolor="Black", showcoastlines=True, coastlinecolor="Black")
-            fig_map.update_layout(
-                title=f"Global Distribution of {selected_blood_type} in {selected_continent}",
-                title_font=dict(size=18, family="Arial, sans-serif", color="#2c3e50", weight="bold"),  # Dark blue, bold, larger font
-                title_x=0.5,  # Center the title
-                title_y=0.95,  # Adjust vertical position slightly
-                title_pad=dict(t=10),  # Add top padding
-                margin=dict(t=50)  # Increase top margin to prevent overlap
-            )
-
-            # Pie Chart
-            pie_data = df_continent[multi_blood_types].mean().reset_index().rename(columns={'index': 'BloodType', 0: 'MeanValue'})
-            fig_pie = px.pie(pie_data, values='MeanValue', names='BloodType', title=f"Blood Type Distribution in {selected_continent}")
-            fig_pie.update_traces(textposition='inside', textinfo='percent+label')
-            fig_pie.update_layout(
-                title_font=dict(size=18, family="Arial, sans-serif", color="#2c3e50", weight="bold"),
-                title_x=0.5,
-                title_y=0.95,
-                title_pad=dict(t=10),
-                margin=dict(t=50)
-            )
-
-            # Bar Chart
-            melt_df = df_continent.melt(id_vars=["Country"], value_vars=multi_blood_types, var_name='BloodType', value_name='Percentage')
-            fig_bar = px.bar(melt_df, x="Country", y="Percentage", color="BloodType", barmode='group', opacity=0.9, title=f"{', '.join(multi_blood_types)} Distribution in {selected_continent}")
-            fig_bar.update_layout(
-                xaxis_tickangle=-45,
-                xaxis_tickfont_size=10,
-                title_font=dict(size=18, family="Arial, sans-serif", color="#2c3e50", weight="bold"),
-                title_x=0.5,
-                title_y=0.95,
-                title_pad=dict(t=10),
-                margin=dict(t=50)
-            )
-
-            # Gauge Chart
-            rarest_blood = df_continent[BLOOD_GROUPS].mean().idxmin()
-            rarest_percentage = df_continent[rarest_blood].mean()
-            global_rarest = df[df['Country'] == 'World'][rarest_blood].values[0] if 'World' in df['Country'].values else rarest_percentage
-            fig_gauge = go.Figure(go.Indicator(mode="gauge+number+delta", value=rarest_percentage, delta={'reference': global_rarest, 'increasing': {'color': "red"}},
-                                              ))
-            fig_gauge.update_layout(
-                title=f"Rarest Blood Type in {selected_continent}: {rarest_blood}",
-                title_font=dict(size=18, family="Arial, sans-serif", color="#2c3e50", weight="bold"),
-                title_x=0.5,
-                title_y=0.95,
-                title_pad=dict(t=10),
-                margin=dict(t=50)
-            )
-
-            # Scatter Plot
-            fig_scatter = px.scatter(df_continent, x="Population", y=selected_blood_type, color="Country", size="Population",
-                                     hover_data=["Rarest_Blood_Type", "Diversity_Index"], log_x=True, title=f"{selected_blood_type} vs Population in {selected_continent}")
-            fig_scatter.update_layout(
-                title_font=dict(size=18, family="Arial, sans-serif", color="#2c3e50", weight="bold"),
-                title_x=0.5,
-                title_y=0.95,
-                title_pad=dict(t=10),
-                margin=dict(t=50)
-            )
-
-            # Heatmap
-            correlation_matrix = df_continent[BLOOD_GROUPS].corr()
-            fig_heatmap = px.imshow(correlation_matrix, text_auto=True, aspect="auto", color_continuous_scale="RdBu", title=f"Blood Type Correlations in {selected_continent}")
-            fig_heatmap.update_layout(
-                title_font=dict(size=18, family="Arial, sans-serif", color="#2c3e50", weight="bold"),
-                title_x=0.5,
-                title_y=0.95,
-                title_pad=dict(t=10),
-                margin=dict(t=50)
-            )
-
-            table_data = df_continent.to_dict('records')
-            return (fig_map, fig_pie, fig_bar, fig_gauge, fig_scatter, fig_heatmap, table_data, "Data loaded successfully")
+            points = data.snapshot.aggregate_index[selected_continent].breakpoints(MAX_SLIDER_MARKS)
+        except Exception as e:
+            logger.error(f"Error in update_slider_marks: {str(e)}")
+            return dash.no_update, dash.no_update, dash.no_update
+        if not len(points):
+            return dash.no_update, dash.no_update, dash.no_update
+        labelled = set(points[np.unique(np.geomspace(1, len(points), LABELLED_SLIDER_MARKS).round().astype(int) - 1)])
+        marks = {int(x): (f'{x / 1e6:.0f}M' if x >= 1e6 else f'{x / 1e3:.0f}K') if x in labelled else '' for x in points}
+        return int(points[0]), int(points[-1]), marks
+
+    @app.callback(Output('choropleth-map', 'figure'), [Input('blood-types-multi', 'value')] + filter_inputs + page_state)
+    def update_choropleth(multi_blood_types, selected_continent, pop_value, page_id):
+        if not multi_blood_types:
+            return dash.no_update
+        return cached_figure(choropleth_figure, page_id, selected_continent, pop_value, multi_blood_types[0])
+
+    @app.callback(Output('pie-chart', 'figure'), [Input('blood-types-multi', 'value')] + filter_inputs + page_state)
+    def update_pie(multi_blood_types, selected_continent, pop_value, page_id):
+        return cached_figure(pie_figure, page_id, selected_continent, pop_value, tuple(multi_blood_types or ()))
+
+    @app.callback(Output('bar-chart', 'figure'), [Input('blood-types-multi', 'value')] + filter_inputs + page_state)
+    def update_bar(multi_blood_types, selected_continent, pop_value, page_id):
+        return cached_figure(bar_figure, page_id, selected_continent, pop_value, tuple(multi_blood_types or ()))
+
+    @app.callback(Output('gauge-chart', 'figure'), filter_inputs + page_state)
+    def update_gauge(selected_continent, pop_value, page_id):
+        return cached_figure(gauge_figure, page_id, selected_continent, pop_value)
 
+    @app.callback(Output('scatter-plot', 'figure'), [Input('blood-types-multi', 'value')] + filter_inputs + page_state)
+    def update_scatter(multi_blood_types, selected_continent, pop_value, page_id):
+        if not multi_blood_types:
+            return dash.no_update
+        return cached_figure(scatter_figure, page_id, selected_continent, pop_value, multi_blood_types[0])
+
+    @app.callback(Output('heatmap', 'figure'), filter_inputs + page_state)
+    def update_heatmap(selected_continent, pop_value, page_id):
+        return cached_figure(heatmap_figure, page_id, selected_continent, pop_value)
+
+    @app.callback(Output('compatibility-chart', 'figure'), filter_inputs + page_state)
+    def update_compatibility(selected_continent, pop_value, page_id):
+        return cached_figure(compatibility_figure, page_id, selected_continent, pop_value)
+
+    @app.callback(Output('compatibility-readout', 'children'), [Input('blood-types-multi', 'value')] + filter_inputs)
+    def update_compatibility_readout(multi_blood_types, selected_continent, pop_value):
+        # One planning query per selected recipient type; each is a binary search and a dot product
+        try:
+            continent_index = data.snapshot.aggregate_index[selected_continent]
+            return [html.Div(f"Eligible donors for {bt} recipients: {continent_eligible_donors(continent_index, bt, pop_value):,.0f}")
+                    for bt in multi_blood_types or ()]
+        except Exception as e:
+            logger.error(f"Error in update_compatibility_readout: {str(e)}")
+            return dash.no_update
+
+    # A background callback like the chart export: a million runs take seconds and must not hold a web worker
+    @app.callback(
+        Output('shortage-chart', 'figure'),
+        Input('sim-run', 'n_clicks'),
+        [State({'type': 'sim-demand', 'index': ALL}, 'value'), State('sim-participation', 'value'), State('sim-participation-variation', 'value'),
+         State('sim-demand-variation', 'value'), State('sim-runs', 'value')],
+        background=True,
+        running=[(Output('sim-run', 'disabled'), True, False)]
+    )
+    def update_shortages(n_clicks, demand, participation, participation_variation, demand_variation, n_sims):
+        # Rates are entered per 1,000 people and in percent; demand has one input per recipient type, in BLOOD_GROUPS order
+        try:
+            scenario = Scenario(transfusions_per_1000=tuple(float(rate) for rate in demand), participation=participation / 100,
+                                participation_cv=participation_variation / 100, demand_cv=demand_variation / 100)
+            snapshot = data.snapshot
+            with timer("dashboard_figure_duration_seconds", figure=shortage_figure.__name__):
+                payload = shortage_figure(snapshot, snapshot.version, scenario, n_sims)
         except Exception as e:
-            logger.error(f"Error in update_all_charts: {str(e)}")
-            return (dash.no_update,) * 6 + ([], f"Error: {str(e)}")
+            logger.error(f"Error in shortage_figure: {str(e)}")
+            return dash.no_update
+        record_payload(payload, False)
+        return payload.figure
 
     @app.callback(
-    Output("sidebar", "is_open"),
-    Input("toggle-sidebar", "n_clicks"),
-    State("sidebar", "is_open"),
-    prevent_initial_call=True  # Ensures callback only runs after a click
+        [Output('data-table', 'data'), Output('data-table', 'page_count'), Output('loading-message', 'children')],
+        filter_inputs + [
+            Input('data-table', 'page_current'),
+            Input('data-table', 'page_size'),
+            Input('data-table', 'sort_by'),
+            Input('data-table', 'filter_query')
+        ] + page_state
     )
-    def toggle_sidebar(toggle_clicks, is_open):
-        return not is_open  # Toggle sidebar state
+    def update_table(selected_continent, pop_value, page_current, page_size, sort_by, filter_query, page_id):
+        def query(full):
+            df_continent = data.snapshot.aggregate_index[selected_continent].rows(pop_value)
+            return query_table(df_continent, page_current, page_size, sort_by, filter_query)
+
+        try:
+            result = coalescer.run(page_key(page_id, 'data-table'), query)
+        except Exception as e:
+            logger.error(f"Error in update_table: {str(e)}")
+            return [], dash.no_update, f"Error: {str(e)}"
+        if result is SUPERSEDED:
+            return dash.no_update, dash.no_update, dash.no_update
+        table_data, page_count = result
+        return table_data, page_count, "Data loaded successfully"
 
+    # Sidebar, modal and theme are pure UI state, handled by assets/clientside.js
+    app.clientside_callback(
+        ClientsideFunction(namespace="ui", function_name="newPageId"),
+        Output("page-id", "data"),
+        Input("main-container", "id")
+    )
 
-    @app.callback(Output("info-modal", "is_open"), [Input("open-info", "n_clicks"), Input("close-info", "n_clicks"), State("info-modal", "is_open")])
-    def toggle_modal(open_n, close_n, is_open):
-        if open_n or close_n:
-            return not is_open
-        return is_open
+    app.clientside_callback(
+        ClientsideFunction(namespace="ui", function_name="toggleSidebar"),
+        Output("sidebar", "is_open"),
+        Input("toggle-sidebar", "n_clicks"),
+        State("sidebar", "is_open"),
+        prevent_initial_call=True  # Ensures callback only runs after a click
+    )
 
-    @app.callback(Output("download-data", "data"), Input("btn-download", "n_clicks"), prevent_initial_call=True)
-    def download_data(n_clicks):
-        return dcc.send_data_frame(df.to_csv, "blood_type_data.csv")
+    app.clientside_callback(
+        ClientsideFunction(namespace="ui", function_name="toggleModal"),
+        Output("info-modal", "is_open"),
+        [Input("open-info", "n_clicks"), Input("close-info", "n_clicks"), State("info-modal", "is_open")]
+    )
 
+    # The data download is a plain link to a streaming Flask route; keep its query string in sync with the filters
+    register_data_export_route(app.server, data)
+
+    @app.callback(Output("btn-download", "href"), [Input('blood-types-multi', 'value')] + filter_inputs + [Input("data-format", "value")])
+    def update_download_link(multi_blood_types, selected_continent, pop_value, data_format):
+        query = urlencode({
+            'continent': selected_continent,
+            'population': pop_value,
+            'blood_types': ','.join(multi_blood_types or []),
+            'format': data_format,
+        })
+        return f"{app.get_relative_path(DATA_EXPORT_ROUTE)}?{query}"
+
+    # Runs as a background callback so rendering never holds a web worker; see export.py
     @app.callback(Output("download-charts", "data"), Input("btn-download-charts", "n_clicks"),
-                  [State('choropleth-map', 'figure')], prevent_initial_call=True)
-    def download_charts(n_clicks, choropleth_fig):
+                  [State(chart_id, 'figure') for chart_id in CHART_IDS] + [State("export-format", "value")],
+                  background=True,
+                  running=[(Output("btn-download-charts", "disabled"), True, False)],
+                  progress=[Output("export-progress", "value"), Output("export-progress", "max")],
+                  prevent_initial_call=True)
+    def download_charts(set_progress, n_clicks, *states):
         try:
-            if not choropleth_fig or 'data' not in choropleth_fig:
-                raise ValueError("No valid figure available")
-            img_bytes = to_image(choropleth_fig, format="png", engine="kaleido", width=1200, height=800)
-            return dcc.send_bytes(img_bytes, "charts.png")
+            *figures, export_format = states
+            payload, filename = export_charts(dict(zip(CHART_IDS, figures)), export_format or "png",
+                                              progress=lambda done, total: set_progress((done, total)))
+            return dcc.send_bytes(payload, filename)
         except Exception as e:
             logger.error(f"Error downloading charts: {str(e)}")
             return dcc.send_string(f"Error: {str(e)}", "error.txt")
         
-    @app.callback(
-    [
-        Output("main-container", "style"),
-        Output("card-1", "style"),
-        Output("card-2", "style"),
-        Output("card-3", "style"),
-        Output("card-4", "style"),
-        Output("card-5", "style"),
-        Output("card-6", "style"),
-        Output("data-table-card", "style"),
-        Output("data-table", "style_data"),
-        # Update DataTable styling
-    ],
-    [Input("dark-mode-toggle", "value")],
+    # Cards, table and toggle label follow the .dark-mode class through assets/styles.css
+    app.clientside_callback(
+        ClientsideFunction(namespace="ui", function_name="toggleDarkMode"),
+        Output("main-container", "className"),
+        Input("dark-mode-toggle", "value")
     )
-    def toggle_dark_mode(dark_mode):
-        if dark_mode:
-            return (
-            DARK_MODE_STYLE,
-            CARD_STYLE_DARK,
-            CARD_STYLE_DARK,
-            CARD_STYLE_DARK,
-            CARD_STYLE_DARK,
-            CARD_STYLE_DARK,
-            CARD_STYLE_DARK,
-            CARD_STYLE_DARK,
-            DATATABLE_STYLE_DARK,  # Apply dark mode style
-        )
-        else:
-            return (
-            LIGHT_MODE_STYLE,
-            CARD_STYLE_LIGHT,
-            CARD_STYLE_LIGHT,
-            CARD_STYLE_LIGHT,
-            CARD_STYLE_LIGHT,
-            CARD_STYLE_LIGHT,
-            CARD_STYLE_LIGHT,
-            CARD_STYLE_LIGHT,
-            DATATABLE_STYLE_LIGHT,  # Apply light mode style
-        )
-    @app.callback(
-    Output("dark-mode-toggle", "style"),  # Update toggle label color dynamically
-    [Input("dark-mode-toggle", "value")]
-    )
-    def update_toggle_label_style(dark_mode):
-        return TOGGLE_LABEL_DARK if dark_mode else TOGGLE_LABEL_LIGHT
-
-
-    
-    
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""Coalescing of callback requests from the same page.
+
+Dragging the population slider queues one request per chart for every
+position the browser reports. Requests for the same (page, chart) run one at
+a time, and a request that was overtaken by a newer one while it waited is
+dropped, so only the in-flight build and the latest position are computed.
+Pages are told apart by the id the ``page-id`` store gets on load (see
+assets/clientside.js), so two tabs of one browser never supersede each other.
+
+A request that only moved the slider may be answered with a patch, but if a
+request that changed more (continent, blood types) was dropped in its favour,
+the client never got that change, so the next request is answered in full.
+
+Coalescing state lives in the worker process. Under gunicorn with several
+workers, a page's requests are spread over them and only those landing on the
+same worker coalesce; the others are all computed (and mostly served from the
+shared figure cache).
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+# (page, chart) pairs tracked at once; the least recently used are forgotten
+MAX_TRACKED = 4096
+
+SUPERSEDED = object()
+
+logger = logging.getLogger(__name__)
+
+
+def page_key(page_id, name):
+    # Requests sent before the page id was set aren't coalesced
+    return None if page_id is None else (page_id, name)
+
+
+class Coalescer:
+    """Runs the latest call per key, one at a time; calls overtaken while waiting return SUPERSEDED."""
+
+    def __init__(self, max_keys=MAX_TRACKED):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # key -> [latest ticket, lock, full request since the last run]
+        self._lock = threading.Lock()
+        self._tickets = 0
+
+    def _enter(self, key, full):
+        with self._lock:
+            self._tickets += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [0, threading.Lock(), False]
+                if len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(key)
+            entry[0] = self._tickets
+            entry[2] = entry[2] or full
+            return entry, self._tickets
+
+    def run(self, key, compute, full=True):
+        """Return ``compute(full)``, or SUPERSEDED if a newer call for ``key`` arrived while this one waited.
+
+        ``full`` is false for calls whose result may be partial; they get ``full=True`` anyway
+        if a full call for ``key`` was dropped since the last one that ran.
+        """
+        if key is None:
+            return compute(full)
+        entry, ticket = self._enter(key, full)
+        with entry[1]:
+            if entry[0] != ticket:
+                logger.debug(f"Dropped superseded request for {key}")
+                return SUPERSEDED
+            full, entry[2] = entry[2], False
+            return compute(full)
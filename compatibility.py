@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from utils import BLOOD_COMPATIBILITY, BLOOD_GROUPS
+
+# COMPATIBILITY_MATRIX[d, r] is True when donor type d can give to recipient type r
+COMPATIBILITY_MATRIX = np.array([[r in BLOOD_COMPATIBILITY[d] for r in BLOOD_GROUPS] for d in BLOOD_GROUPS])
+_DONOR_TO_RECIPIENT = COMPATIBILITY_MATRIX.astype(float)
+
+
+def eligible_donors(donor_pools):
+    """People who can donate to each recipient type.
+
+    ``donor_pools`` is (..., 8) people per blood type in BLOOD_GROUPS order, for
+    one region or a whole matrix of regions; the result has the same shape,
+    indexed by recipient type.
+    """
+    return np.asarray(donor_pools, dtype=float) @ _DONOR_TO_RECIPIENT
+
+
+def eligible_recipients(donor_pools):
+    """People each donor type can give to, same shape and ordering as ``eligible_donors``."""
+    return np.asarray(donor_pools, dtype=float) @ _DONOR_TO_RECIPIENT.T
+
+
+def compatibility_summary(donor_pools):
+    pools = np.asarray(donor_pools, dtype=float)
+    return pd.DataFrame({
+        'Population': pools,
+        'Eligible_Donors': eligible_donors(pools),
+        'Eligible_Recipients': eligible_recipients(pools),
+    }, index=pd.Index(BLOOD_GROUPS, name='BloodType'))
+
+
+def continent_eligible_donors(continent_index, recipient_type, pop_cap):
+    """People in the continent's countries of at most ``pop_cap`` people who can donate to ``recipient_type``."""
+    # Donor pools are additive, so the prefix-summed pool for the cap can be multiplied directly
+    pools = continent_index.pool_totals(pop_cap)
+    return float(pools @ _DONOR_TO_RECIPIENT[:, BLOOD_GROUPS.index(recipient_type)])
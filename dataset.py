@@ -0,0 +1,160 @@
+"""Versioned dataset snapshots, hot-reloaded when the processed CSV changes.
+
+Readers take ``manager.snapshot`` once and use only that object, so a reload
+that swaps in a new snapshot never mixes rows from two versions. Each
+continent carries a content hash; figure caches key on it, so after a reload
+only the continents whose rows changed are rebuilt.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from store import CATEGORICAL_COLUMNS, PERCENT_DECIMALS, BloodTypeStore, load_store, save_store, store_path
+from utils import BLOOD_GROUPS, DATA_FILE, DONOR_POOL_COLUMNS, build_aggregate_index, preprocess
+
+# Seconds between checks of the data file; 0 disables watching
+WATCH_INTERVAL = float(os.environ.get("DATA_WATCH_INTERVAL", "5"))
+STORE_COLUMNS = CATEGORICAL_COLUMNS + ["Population"] + BLOOD_GROUPS + DONOR_POOL_COLUMNS + ["Diversity_Index"]
+# Columns of the processed CSV that preprocess() derives everything else from
+SOURCE_COLUMNS = ["Region", "Country", "Population"] + BLOOD_GROUPS + ["Rarest_Blood_Type", "Diversity_Index"]
+
+logger = logging.getLogger(__name__)
+
+Snapshot = namedtuple('Snapshot', ['version', 'store', 'aggregate_index', 'continent_versions'])
+
+
+def continent_versions(store, aggregate_index):
+    """Content hash of each continent's rows, stable across processes.
+
+    The World row is hashed into every continent because the gauge compares against it.
+    """
+    world = store.find_country('World')
+    shared = [] if world is None else [world]
+    versions = {}
+    for continent, continent_index in aggregate_index.items():
+        positions = np.concatenate([np.sort(continent_index.positions), shared]).astype(np.intp)
+        digest = hashlib.sha256(continent.encode())
+        for array in (store.population, store.percentages, store.donor_pools, store.diversity):
+            digest.update(np.ascontiguousarray(array[positions]).tobytes())
+        for col in CATEGORICAL_COLUMNS:
+            digest.update("\0".join(map(str, store.decode(col, positions))).encode())
+        versions[continent] = digest.hexdigest()[:16]
+    return versions
+
+
+def build_snapshot(store, version):
+    aggregate_index = build_aggregate_index(store)
+    return Snapshot(version, store, aggregate_index, continent_versions(store, aggregate_index))
+
+
+def refresh_store(old_store, file_path=DATA_FILE):
+    """Store for the current ``file_path``, preprocessing only rows that differ from ``old_store``.
+
+    Rows are matched on Region (the country name in country-level files); if
+    that key is not unique the whole file is preprocessed again.
+    """
+    path = store_path(file_path)
+    if os.path.isdir(path):
+        return BloodTypeStore.open(path)
+
+    source = pd.read_csv(file_path)
+    if 'Region' not in source:
+        source['Region'] = source['Country']
+    previous = old_store.frame(columns=STORE_COLUMNS)
+    if not (source['Region'].is_unique and previous['Region'].is_unique):
+        return load_store(file_path)
+
+    matched = previous.set_index('Region').reindex(source['Region'])
+    unchanged = matched['Country'].notna().to_numpy()
+    for col in SOURCE_COLUMNS[1:]:
+        new, old = source[col].to_numpy(), matched[col].to_numpy()
+        if col in BLOOD_GROUPS:
+            new = np.round(new.astype(float), PERCENT_DECIMALS)
+        unchanged = unchanged & ((new == old) | (pd.isna(new) & pd.isna(old)))
+
+    changed = source[~unchanged]
+    logger.info(f"Re-ingesting {len(changed)} of {len(source)} rows from {file_path}")
+    frame = pd.concat([
+        matched[unchanged].reset_index().set_axis(source.index[unchanged]),
+        preprocess(changed.copy()) if len(changed) else None,
+    ])
+    return save_store(BloodTypeStore.from_frame(frame.sort_index()[STORE_COLUMNS]), path)
+
+
+class DataManager:
+    """Holds the current Snapshot of ``file_path`` and swaps in a new one when the file changes.
+
+    ``subscribe(fn)`` registers ``fn(snapshot, changed_continents)``, called
+    after every swap.
+    """
+
+    def __init__(self, file_path=DATA_FILE):
+        self.file_path = file_path
+        self.snapshot = build_snapshot(load_store(file_path), os.path.basename(store_path(file_path)))
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._seen_stat = self._stat()
+        self._interval = 0
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        """Swap in the file's current contents if they changed; returns the continents whose rows changed."""
+        with self._lock:
+            old = self.snapshot
+            version = os.path.basename(store_path(self.file_path))
+            if version == old.version:
+                return set()
+            start = time.perf_counter()
+            new = build_snapshot(refresh_store(old.store, self.file_path), version)
+            changed = {c for c in set(old.continent_versions) | set(new.continent_versions)
+                       if old.continent_versions.get(c) != new.continent_versions.get(c)}
+            self.snapshot = new
+            logger.info(f"Loaded dataset {version} in {time.perf_counter() - start:.2f}s; changed continents: {sorted(changed) or 'none'}")
+        for listener in self._listeners:
+            try:
+                listener(new, changed)
+            except Exception as e:
+                logger.error(f"Error in dataset reload listener: {e}")
+        return changed
+
+    def _watch(self):
+        pending = None
+        while True:
+            time.sleep(self._interval)
+            stat = self._stat()
+            if stat is None or stat == self._seen_stat:
+                continue
+            # Wait until the file has stopped changing for one interval, so half-written files are skipped
+            if stat != pending:
+                pending = stat
+                continue
+            self._seen_stat = stat
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Could not reload {self.file_path}, still serving {self.snapshot.version}: {e}")
+
+    def watch(self, interval=WATCH_INTERVAL):
+        """Poll the data file every ``interval`` seconds in a daemon thread.
+
+        Threads do not survive fork, so a preloading server calls this in each worker.
+        """
+        if interval <= 0 or self._interval:
+            return
+        self._interval = interval
+        threading.Thread(target=self._watch, name="dataset-watcher", daemon=True).start()
@@ -0,0 +1,445 @@
+import fcntl
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.managers import BaseManager
+
+import flask
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+from utils import BLOOD_GROUPS, CACHE_DIR, write_atomic
+
+EXPORT_FORMATS = ['png', 'svg', 'pdf']
+EXPORT_WIDTH = 1200
+EXPORT_HEIGHT = 800
+EXPORT_DIR = os.path.join(CACHE_DIR, "exports")
+DATA_EXPORT_ROUTE = "/download/data"
+# format -> (mimetype, file extension); Parquet only if the optional pyarrow is installed
+DATA_EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "csv.gz": ("application/gzip", "csv.gz"),
+}
+if importlib.util.find_spec("pyarrow") is not None:
+    DATA_EXPORT_FORMATS["parquet"] = ("application/vnd.apache.parquet", "parquet")
+DATA_EXPORT_CHUNK_ROWS = 50_000
+# Each worker keeps its own Kaleido/Chromium instance alive between exports
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", "2"))
+# The render service listens here, shared by every web worker and export job of this checkout
+RENDER_SOCKET = os.path.join(CACHE_DIR, "render.sock")
+RENDER_KEY_FILE = os.path.join(CACHE_DIR, "render.key")
+RENDER_LOCK_FILE = os.path.join(CACHE_DIR, "render.lock")
+RENDER_LOG_FILE = os.path.join(CACHE_DIR, "render.log")
+# Seconds without an export before the render service and its browsers exit; the next export restarts it
+RENDER_IDLE_TIMEOUT = float(os.environ.get("EXPORT_IDLE_TIMEOUT", "900"))
+RENDER_START_TIMEOUT = 30
+# Seconds one render (or a worker's warm-up) may take; a worker that overruns is killed and replaced
+RENDER_TIMEOUT = int(os.environ.get("EXPORT_TIMEOUT", "30"))
+# After workers fail, exports fail at once for this many seconds instead of waiting on new ones that may fail too
+RENDER_RETRY_INTERVAL = 60
+# Rendered images and data files kept in EXPORT_DIR; the least recently used are removed past this
+EXPORT_CACHE_BYTES = int(os.environ.get("EXPORT_CACHE_MB", "512")) * 2**20
+
+logger = logging.getLogger(__name__)
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def _warm_renderer():
+    # Start Kaleido's persistent browser (kaleido>=1) and pay the first-render cost up front.
+    # Kaleido without a browser can block forever instead of raising, so SIGALRM (default action: exit) bounds it;
+    # either way a failure breaks the pool, which RenderService replaces
+    signal.alarm(RENDER_TIMEOUT)
+    try:
+        import kaleido
+        if hasattr(kaleido, "start_sync_server"):
+            kaleido.start_sync_server(silence_warnings=True)
+        pio.to_image(go.Figure(), format="png", width=10, height=10)
+    except Exception as e:
+        logger.error(f"Could not start chart renderer: {e}")
+        raise
+    finally:
+        signal.alarm(0)
+
+
+def _render(figure, fmt, width, height):
+    signal.alarm(RENDER_TIMEOUT)
+    try:
+        return pio.to_image(figure, format=fmt, width=width, height=height)
+    finally:
+        signal.alarm(0)
+
+
+def _noop():
+    pass
+
+
+class RenderService:
+    """Runs in the render service process, where its pool of warm Kaleido workers outlives every export job."""
+
+    def __init__(self, workers=EXPORT_WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._failed_at = None
+        self._start_pool()
+        self.last_used = time.monotonic()
+
+    def _start_pool(self):
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_renderer)
+        # Start and warm every worker now rather than on the first export, without holding up the listener
+        for _ in range(self.workers):
+            self._pool.submit(_noop)
+
+    def _pool_for_render(self):
+        with self._lock:
+            if self._failed_at is not None:
+                if time.monotonic() - self._failed_at < RENDER_RETRY_INTERVAL:
+                    raise RuntimeError(f"Chart renderer is not working, see {RENDER_LOG_FILE}")
+                logger.info("Restarting render workers")
+                self._failed_at = None
+                self._start_pool()
+            return self._pool
+
+    def _pool_failed(self, pool):
+        with self._lock:
+            if pool is self._pool and self._failed_at is None:
+                logger.error("A render worker failed to start or timed out")
+                self._failed_at = time.monotonic()
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def render(self, figure, fmt, width, height):
+        self.last_used = time.monotonic()
+        pool = self._pool_for_render()
+        try:
+            # A queued render may wait for the one ahead of it on its worker
+            return pool.submit(_render, figure, fmt, width, height).result(timeout=2 * RENDER_TIMEOUT)
+        except BrokenProcessPool:
+            self._pool_failed(pool)
+            raise RuntimeError(f"Chart renderer is not working, see {RENDER_LOG_FILE}")
+        finally:
+            self.last_used = time.monotonic()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class RenderManager(BaseManager):
+    pass
+
+
+RenderManager.register("service")
+
+
+def serve_renderer():
+    """Serve a RenderService on RENDER_SOCKET until it has been idle for RENDER_IDLE_TIMEOUT seconds.
+
+    Returns at once if another render service holds the lock.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(RENDER_LOCK_FILE, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        # Holding the lock, any socket left here is from a service that died
+        if os.path.exists(RENDER_SOCKET):
+            os.unlink(RENDER_SOCKET)
+        service = RenderService()
+        authkey = os.urandom(32)
+        RenderManager.register("service", callable=lambda: service)
+        server = RenderManager(address=RENDER_SOCKET, authkey=authkey).get_server()
+        write_atomic(RENDER_KEY_FILE, authkey)
+
+        def stop_when_idle():
+            while time.monotonic() - service.last_used < RENDER_IDLE_TIMEOUT:
+                time.sleep(min(RENDER_IDLE_TIMEOUT, 30))
+            logger.info("Render service idle, shutting down")
+            service.shutdown()
+            os.unlink(RENDER_SOCKET)
+            # Started in its own session, the service leads a process group with its workers and their browsers
+            if os.getpgid(0) == os.getpid():
+                os.killpg(0, signal.SIGTERM)
+            os._exit(0)
+
+        threading.Thread(target=stop_when_idle, daemon=True).start()
+        logger.info(f"Render service with {EXPORT_WORKERS} workers listening on {RENDER_SOCKET}")
+        server.serve_forever()
+
+
+def _connect_render_service():
+    deadline = time.monotonic() + RENDER_START_TIMEOUT
+    spawned = False
+    while True:
+        try:
+            with open(RENDER_KEY_FILE, "rb") as f:
+                manager = RenderManager(address=RENDER_SOCKET, authkey=f.read())
+            manager.connect()
+            return manager.service()
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            if time.monotonic() > deadline:
+                raise
+            if not spawned:
+                # Detached, so it outlives this job and serves the ones after it
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                with open(RENDER_LOG_FILE, "ab") as log:
+                    subprocess.Popen([sys.executable, os.path.abspath(__file__)], cwd=os.getcwd(), stdin=subprocess.DEVNULL,
+                                     stdout=log, stderr=log, start_new_session=True)
+                spawned = True
+            time.sleep(0.2)
+
+
+def get_render_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = _connect_render_service()
+        return _service
+
+
+def _render_remote(figure, fmt, width, height):
+    global _service
+    try:
+        return get_render_service().render(figure, fmt, width, height)
+    except (ConnectionError, EOFError):
+        # The service exited (idle timeout or crash) since we connected; start or find a new one
+        with _service_lock:
+            _service = None
+        return get_render_service().render(figure, fmt, width, height)
+
+
+def figure_hash(figure, fmt, width=EXPORT_WIDTH, height=EXPORT_HEIGHT):
+    payload = json.dumps([figure, fmt, width, height], sort_keys=True, cls=PlotlyJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def prune_export_cache(max_bytes=EXPORT_CACHE_BYTES):
+    """Remove the least recently used files in EXPORT_DIR until they take at most ``max_bytes``."""
+    try:
+        entries = [entry for entry in os.scandir(EXPORT_DIR) if entry.is_file() and not entry.name.endswith(".tmp")]
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    total = 0
+    for entry in entries:
+        total += entry.stat().st_size
+        if total > max_bytes:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def open_cached_export(path):
+    """``path`` opened for reading and marked as recently used, or None if it isn't cached.
+
+    An open file stays readable even if another process prunes it.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return f
+
+
+def render_figures(figures, fmt, progress=None, width=EXPORT_WIDTH, height=EXPORT_HEIGHT):
+    """Render each figure to ``fmt`` bytes, reusing any image already exported with the same hash.
+
+    ``progress(done, total)`` is called as images become available.
+    """
+    images = [None] * len(figures)
+    pending = {}
+    done = 0
+    # Threads only wait on the render service, which renders up to EXPORT_WORKERS images at once
+    requests = ThreadPoolExecutor(max_workers=EXPORT_WORKERS)
+    try:
+        for i, figure in enumerate(figures):
+            path = os.path.join(EXPORT_DIR, f"{figure_hash(figure, fmt, width, height)}.{fmt}")
+            cached = open_cached_export(path)
+            if cached is not None:
+                with cached:
+                    images[i] = cached.read()
+                done += 1
+            else:
+                pending[requests.submit(_render_remote, figure, fmt, width, height)] = (i, path)
+        if progress:
+            progress(done, len(figures))
+
+        # The service times renders out itself; this only guards against a service that stopped answering
+        for future in as_completed(pending, timeout=RENDER_START_TIMEOUT + 2 * RENDER_TIMEOUT * len(pending)):
+            i, path = pending[future]
+            images[i] = future.result()
+            try:
+                write_atomic(path, images[i])
+            except OSError as e:
+                logger.warning(f"Could not cache exported chart {path}: {e}")
+            done += 1
+            if progress:
+                progress(done, len(figures))
+    finally:
+        # Not waiting: a thread stuck on an unresponsive service must not hold up the error response
+        requests.shutdown(wait=False, cancel_futures=True)
+    if pending:
+        prune_export_cache()
+    return images
+
+
+def export_charts(figures_by_id, fmt, progress=None):
+    """Bundle the drawn figures, in ``figures_by_id`` order, into one download: a multi-page PDF, or a zip of PNG/SVG files."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    chart_ids = [chart_id for chart_id, figure in figures_by_id.items() if figure and 'data' in figure]
+    if not chart_ids:
+        raise ValueError("No valid figure available")
+    images = render_figures([figures_by_id[chart_id] for chart_id in chart_ids], fmt, progress)
+
+    if fmt == "pdf":
+        from pypdf import PdfWriter
+        writer = PdfWriter()
+        for image in images:
+            writer.append(io.BytesIO(image))
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue(), "charts.pdf"
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for chart_id, image in zip(chart_ids, images):
+            archive.writestr(f"{chart_id}.{fmt}", image)
+    return buffer.getvalue(), f"charts_{fmt}.zip"
+
+
+def data_export_columns(blood_types):
+    blood_types = [bt for bt in BLOOD_GROUPS if bt in blood_types] or BLOOD_GROUPS
+    return (["Country", "Population"] + blood_types + ["Continent", "Rarest_Blood_Type", "Diversity_Index", "Can_Donate_To"]
+            + [f"Donor_Pool_{bt}" for bt in blood_types])
+
+
+def iter_frames(store, positions, columns):
+    for start in range(0, max(len(positions), 1), DATA_EXPORT_CHUNK_ROWS):
+        yield store.frame(positions[start:start + DATA_EXPORT_CHUNK_ROWS], columns)
+
+
+def iter_csv(store, positions, columns):
+    for i, frame in enumerate(iter_frames(store, positions, columns)):
+        yield frame.to_csv(index=False, header=(i == 0)).encode()
+
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def tee_to_cache(chunks, path):
+    """Yield ``chunks`` while writing them to ``path``; the file only appears once the stream completes."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    complete = False
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(tmp_path, path)
+        complete = True
+    finally:
+        if not complete:
+            os.unlink(tmp_path)
+    prune_export_cache()
+
+
+def write_parquet(store, positions, columns, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        writer = None
+        for frame in iter_frames(store, positions, columns):
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            writer = writer or pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+        writer.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def data_export_key(file_path, version, continent, row_count, columns, fmt):
+    # Keyed on the snapshot the rows come from, not the file on disk, which may be ahead of it until the next reload
+    payload = json.dumps([file_path, version, continent, row_count, columns, fmt])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def data_export_response(data, continent, pop_cap, blood_types, fmt):
+    snapshot = data.snapshot
+    if continent not in snapshot.aggregate_index or fmt not in DATA_EXPORT_FORMATS:
+        flask.abort(400)
+    mimetype, extension = DATA_EXPORT_FORMATS[fmt]
+    continent_index = snapshot.aggregate_index[continent]
+    positions = continent_index.row_positions(pop_cap)
+    columns = data_export_columns(blood_types)
+    filename = f"blood_type_data_{continent.replace(' ', '_')}.{extension}"
+
+    # Any cap with the same matching rows yields the same file
+    path = os.path.join(EXPORT_DIR, f"data-{data_export_key(data.file_path, snapshot.version, continent, len(positions), columns, fmt)}.{extension}")
+    cached = open_cached_export(path)
+    if cached is None and fmt == "parquet":
+        write_parquet(continent_index.store, positions, columns, path)
+        cached = open(path, "rb")
+        prune_export_cache()
+    if cached is not None:
+        return flask.send_file(cached, mimetype=mimetype, as_attachment=True, download_name=filename)
+
+    chunks = iter_csv(continent_index.store, positions, columns)
+    if fmt == "csv.gz":
+        chunks = iter_gzip(chunks)
+    return flask.Response(tee_to_cache(chunks, path), mimetype=mimetype,
+                          headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+def register_data_export_route(server, data):
+    # ``data`` is the DataManager; its snapshot is taken once per request, so the route follows dataset reloads
+    def download_data_route():
+        args = flask.request.args
+        try:
+            pop_cap = float(args.get("population", "inf"))
+        except ValueError:
+            flask.abort(400)
+        blood_types = [bt for bt in args.get("blood_types", "").split(",") if bt]
+        return data_export_response(data, args.get("continent", ""), pop_cap, blood_types, args.get("format", "csv"))
+
+    server.add_url_rule(DATA_EXPORT_ROUTE, "download_data", download_data_route)
+
+
+if __name__ == "__main__":
+    # Started by _connect_render_service; import by name so pool workers unpickle export._render, not __main__._render
+    logging.basicConfig(level=logging.INFO, force=True)
+    import export
+    export.serve_renderer()
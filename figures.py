@@ -0,0 +1,149 @@
+import functools
+import logging
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+import plotly.graph_objects as go
+from dash import Patch
+from plotly.io.json import to_json_plotly
+
+logger = logging.getLogger(__name__)
+
+# Title styling shared by every dashboard chart
+TITLE_LAYOUT = dict(
+    title_font=dict(size=18, family="Arial, sans-serif", color="#2c3e50", weight="bold"),  # Dark blue, bold, larger font
+    title_x=0.5,  # Center the title
+    title_y=0.95,  # Adjust vertical position slightly
+    title_pad=dict(t=10),  # Add top padding
+    margin=dict(t=50)  # Increase top margin to prevent overlap
+)
+
+# Static per-chart layout, built once and applied to every figure of that chart
+CHART_LAYOUTS = {
+    'choropleth': go.Layout(**TITLE_LAYOUT),
+    'pie': go.Layout(**TITLE_LAYOUT),
+    'bar': go.Layout(xaxis_tickangle=-45, xaxis_tickfont_size=10, **TITLE_LAYOUT),
+    'gauge': go.Layout(**TITLE_LAYOUT),
+    'scatter': go.Layout(**TITLE_LAYOUT),
+    'heatmap': go.Layout(**TITLE_LAYOUT),
+    'compatibility': go.Layout(barmode='group', yaxis_title="People", **TITLE_LAYOUT),
+    'shortage': go.Layout(**TITLE_LAYOUT),
+}
+
+# figure: full plotly JSON; patch: everything but the template, for clients already showing this chart
+FigurePayload = namedtuple('FigurePayload', ['figure', 'patch', 'figure_bytes', 'patch_bytes'])
+
+payload_stats = {'responses': 0, 'patched': 0, 'full_bytes': 0, 'sent_bytes': 0}
+_stats_lock = threading.Lock()
+
+# diskcache.Cache shared by every worker process; None (the default) keeps figures in process memory only
+_shared_cache = None
+
+
+def figure_patch(figure):
+    patch = Patch()
+    patch['data'] = figure['data']
+    # Axis titles, legends and map ranges follow the rows shown, so every layout key is resent whole;
+    # only the template (most of the bytes) is the same for every figure of a chart
+    for key, value in figure['layout'].items():
+        if key != 'template':
+            patch['layout'][key] = value
+    return patch
+
+
+def figure_payload(fig, chart):
+    fig.update_layout(CHART_LAYOUTS[chart])
+    figure = fig.to_plotly_json()
+    patch = figure_patch(figure)
+    return FigurePayload(
+        figure=figure,
+        patch=patch,
+        figure_bytes=len(to_json_plotly(figure)),
+        patch_bytes=len(to_json_plotly(patch.to_plotly_json())),
+    )
+
+
+def enable_shared_cache(directory, size_limit=2**30):
+    """Back the figure builders with an on-disk cache at ``directory``, starting empty.
+
+    Entries from an earlier run are dropped, since they may come from other code.
+    """
+    global _shared_cache
+    import diskcache
+    _shared_cache = diskcache.Cache(directory, size_limit=size_limit)
+    _shared_cache.clear()
+    return _shared_cache
+
+
+def _shared_payload(builder, snapshot, key):
+    if _shared_cache is None:
+        return builder(snapshot, *key)
+    cache_key = (builder.__name__,) + key
+    cached = _shared_cache.get(cache_key)
+    if cached is not None:
+        figure, figure_bytes, patch_bytes = cached
+        return FigurePayload(figure, figure_patch(figure), figure_bytes, patch_bytes)
+    payload = builder(snapshot, *key)
+    try:
+        _shared_cache.set(cache_key, (payload.figure, payload.figure_bytes, payload.patch_bytes))
+    except Exception as e:
+        logger.warning(f"Could not share {builder.__name__} figure: {e}")
+    return payload
+
+
+class _Unkeyed:
+    """Carries an argument through ``lru_cache`` without making it part of the key."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return 0
+
+    def __eq__(self, other):
+        return isinstance(other, _Unkeyed)
+
+
+def figure_cache(maxsize):
+    """Memoize ``builder(snapshot, version, *args)`` on ``(version, *args)``, in process and in the shared cache.
+
+    Builders read rows only from the snapshot they are passed, and ``version`` is that snapshot's version of
+    the data they read, so a figure is never cached under the version of another snapshot.
+    """
+    def decorate(builder):
+        @lru_cache(maxsize=maxsize)
+        def memoized(snapshot, *key):
+            return _shared_payload(builder, snapshot.value, key)
+
+        @functools.wraps(builder)
+        def cached(snapshot, *key):
+            unkeyed = _Unkeyed(snapshot)
+            try:
+                return memoized(unkeyed, *key)
+            finally:
+                # The cache keeps its keys; don't let them hold on to replaced snapshots
+                unkeyed.value = None
+
+        cached.cache_info = memoized.cache_info
+        return cached
+    return decorate
+
+
+def record_payload(payload, patched):
+    sent = payload.patch_bytes if patched else payload.figure_bytes
+    with _stats_lock:
+        payload_stats['responses'] += 1
+        payload_stats['patched'] += int(patched)
+        payload_stats['full_bytes'] += payload.figure_bytes
+        payload_stats['sent_bytes'] += sent
+    if patched:
+        logger.debug(f"Sent {sent} byte patch instead of {payload.figure_bytes} byte figure")
+
+
+def payload_savings():
+    with _stats_lock:
+        stats = dict(payload_stats)
+    stats['saved_bytes'] = stats['full_bytes'] - stats['sent_bytes']
+    return stats
@@ -0,0 +1,111 @@
+"""Map geometry for the choropleth, resolved once per continent.
+
+Countries are located by ISO-3 code (resolved at ingest, see
+utils.country_to_iso3). If a country GeoJSON file is present, each
+continent's outlines are cut from it once, simplified and served inline,
+with the map bounds taken from those outlines. Otherwise Plotly's built-in
+ISO-3 base map is used with a fixed box per continent. Either way
+``fitbounds`` is never computed in the browser.
+"""
+import json
+import logging
+import os
+from functools import lru_cache
+
+import numpy as np
+
+# Optional country outlines, e.g. Natural Earth admin-0 exported as GeoJSON
+GEOJSON_FILE = os.environ.get("COUNTRY_GEOJSON", os.path.join("Data", "countries.geojson"))
+# Coordinates are rounded to this many decimals (~1 km) and repeated points dropped
+GEOJSON_DECIMALS = 2
+# Feature properties that may hold the ISO-3 code; Natural Earth uses "-99" when ISO_A3 is unassigned
+ISO3_PROPERTIES = ["ISO_A3", "ADM0_A3", "iso_a3", "ISO3"]
+# (lon_min, lon_max, lat_min, lat_max) when there is no GeoJSON to measure
+CONTINENT_BOUNDS = {
+    "Europe": (-25.0, 45.0, 34.0, 72.0),
+    "Africa": (-26.0, 60.0, -36.0, 38.0),
+    "Asia": (25.0, 150.0, -12.0, 56.0),
+    "North America": (-170.0, -52.0, 5.0, 75.0),
+    "South America": (-82.0, -34.0, -56.0, 13.0),
+    "Oceania": (110.0, 180.0, -48.0, 0.0),
+}
+WORLD_BOUNDS = (-180.0, 180.0, -60.0, 85.0)
+
+logger = logging.getLogger(__name__)
+
+
+def _feature_iso3(feature):
+    properties = feature.get("properties") or {}
+    for key in ISO3_PROPERTIES:
+        code = properties.get(key)
+        if isinstance(code, str) and len(code) == 3 and code != "-99":
+            return code
+    code = feature.get("id")
+    return code if isinstance(code, str) and len(code) == 3 else None
+
+
+def _simplify_ring(ring):
+    points = np.round(np.asarray(ring, dtype=float)[:, :2], GEOJSON_DECIMALS)
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = (points[1:] != points[:-1]).any(axis=1)
+    points = points[keep]
+    return points.tolist() if len(points) >= 4 else None
+
+
+def _simplify(geometry):
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        return None
+    simplified = []
+    for polygon in polygons:
+        rings = [_simplify_ring(ring) for ring in polygon]
+        # A polygon whose outer ring collapsed is too small to see
+        if rings and rings[0] is not None:
+            simplified.append([ring for ring in rings if ring is not None])
+    return {"type": "MultiPolygon", "coordinates": simplified} if simplified else None
+
+
+@lru_cache(maxsize=1)
+def country_features(path=GEOJSON_FILE):
+    """Simplified country geometries by ISO-3 code; empty if ``path`` doesn't exist or can't be read."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            collection = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable country GeoJSON {path}: {e}")
+        return {}
+    features = {}
+    for feature in collection.get("features", []):
+        code = _feature_iso3(feature)
+        geometry = _simplify(feature["geometry"]) if code and feature.get("geometry") else None
+        if geometry is not None:
+            features[code] = {"type": "Feature", "id": code, "properties": {}, "geometry": geometry}
+    logger.info(f"Loaded outlines of {len(features)} countries from {path}")
+    return features
+
+
+def _bounds(features):
+    points = np.concatenate([np.asarray(ring) for feature in features
+                             for polygon in feature["geometry"]["coordinates"] for ring in polygon])
+    (lon_min, lat_min), (lon_max, lat_max) = points.min(axis=0), points.max(axis=0)
+    return float(lon_min), float(lon_max), float(lat_min), float(lat_max)
+
+
+@lru_cache(maxsize=64)
+def continent_geometry(continent, iso3_codes):
+    """(GeoJSON FeatureCollection or None, bounds) for the countries ``iso3_codes`` (a sorted tuple) of ``continent``."""
+    features = country_features()
+    selected = [features[code] for code in iso3_codes if code in features]
+    fallback = CONTINENT_BOUNDS.get(continent, WORLD_BOUNDS)
+    if not selected:
+        return None, fallback
+    bounds = _bounds(selected)
+    # Outlines crossing the antimeridian (Russia, Fiji) would stretch the box around the globe
+    if bounds[1] - bounds[0] > 180:
+        bounds = fallback
+    return {"type": "FeatureCollection", "features": selected}, bounds
@@ -0,0 +1,18 @@
+import multiprocessing
+import os
+
+wsgi_app = "wsgi:server"
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '8050')}")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("WEB_THREADS", "4"))
+worker_class = "gthread"
+# Load the data and warm caches once in the master, before forking workers
+preload_app = True
+# Slack for cold figure builds and the first chart export of a worker
+timeout = 120
+
+
+def post_fork(server, worker):
+    # Each worker watches the data file itself; the master's threads don't survive the fork
+    from callbacks import data
+    data.watch()
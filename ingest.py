@@ -0,0 +1,90 @@
+import argparse
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from utils import BLOOD_GROUPS, COUNTRY_NAME_NOISE, DATA_FILE, country_continent_table, country_iso3_table
+
+# Schema of the raw Wikipedia-style export and of the processed CSV load_and_preprocess_data reads
+RAW_COUNTRY_COLUMN = "Country/Dependency"
+# Optional; present in sub-national registry extracts, one row per region
+RAW_REGION_COLUMN = "Region"
+PROCESSED_COLUMNS = ["Country", "ISO3", "Population"] + BLOOD_GROUPS + ["Continent", "Rarest_Blood_Type", "Diversity_Index"]
+RAW_FILE = "Data/blood_type_distribution_by_country.csv"
+CHUNK_SIZE = 100_000
+
+logger = logging.getLogger(__name__)
+
+
+def clean_chunk(chunk):
+    # Same steps as the notebook: strip footnotes and stray bytes, drop "%" and ",", fillna(0)
+    chunk.columns = chunk.columns.str.strip()
+    country = chunk[RAW_COUNTRY_COLUMN].str.replace(COUNTRY_NAME_NOISE, "", regex=True).str.strip()
+    cleaned = pd.DataFrame({"Country": country})
+    if RAW_REGION_COLUMN in chunk:
+        cleaned.insert(0, "Region", chunk[RAW_REGION_COLUMN].str.strip())
+    cleaned["Population"] = pd.to_numeric(chunk["Population"].str.replace(",", "", regex=False), errors="coerce").astype(float)
+    for col in BLOOD_GROUPS:
+        cleaned[col] = pd.to_numeric(chunk[col].str.replace("%", "", regex=False), errors="coerce").astype(float)
+    cleaned = cleaned.fillna({col: 0.0 for col in ["Population"] + BLOOD_GROUPS})
+    return cleaned[cleaned["Country"].fillna("") != ""]
+
+
+def enrich_chunk(cleaned, continent_table, iso3_table):
+    unseen = cleaned.loc[~cleaned["Country"].isin(continent_table.keys()), "Country"]
+    continent_table.update(country_continent_table(unseen))
+    iso3_table.update(country_iso3_table(unseen))
+    cleaned["Continent"] = cleaned["Country"].map(continent_table)
+    cleaned["ISO3"] = cleaned["Country"].map(iso3_table)
+
+    values = cleaned[BLOOD_GROUPS].to_numpy(dtype=float)
+    cleaned["Rarest_Blood_Type"] = np.asarray(BLOOD_GROUPS)[values.argmin(axis=1)]
+
+    # Shannon entropy (nats) of the blood-group shares, with 0 * log(0) taken as 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shares = values / values.sum(axis=1, keepdims=True)
+        cleaned["Diversity_Index"] = -np.where(shares > 0, shares * np.log(shares), 0.0).sum(axis=1)
+    return cleaned[(["Region"] if "Region" in cleaned else []) + PROCESSED_COLUMNS]
+
+
+def iter_processed_chunks(source, chunksize=CHUNK_SIZE):
+    """Yield processed frames of at most ``chunksize`` rows from a raw export.
+
+    Only one chunk plus the country -> continent and country -> ISO-3 tables are held in memory at a time.
+    """
+    continent_table, iso3_table = {}, {}
+    reader = pd.read_csv(source, chunksize=chunksize, dtype=str, encoding="utf-8", encoding_errors="replace")
+    for chunk in reader:
+        yield enrich_chunk(clean_chunk(chunk), continent_table, iso3_table)
+
+
+def ingest(source=RAW_FILE, destination=DATA_FILE, chunksize=CHUNK_SIZE):
+    directory = os.path.dirname(os.path.abspath(destination))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    rows = 0
+    try:
+        with os.fdopen(fd, "w", newline="") as f:
+            for i, processed in enumerate(iter_processed_chunks(source, chunksize)):
+                processed.to_csv(f, header=(i == 0), index=False)
+                rows += len(processed)
+            if rows == 0:
+                pd.DataFrame(columns=PROCESSED_COLUMNS).to_csv(f, index=False)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.info(f"Ingested {rows} rows from {source} into {destination}")
+    return rows
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Clean a raw blood type export into the dashboard's processed CSV")
+    parser.add_argument("source", nargs="?", default=RAW_FILE)
+    parser.add_argument("destination", nargs="?", default=DATA_FILE)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    ingest(args.source, args.destination, args.chunksize)
@@ -1,58 +1,17 @@
 import dash_bootstrap_components as dbc
 from dash import dcc, html, dash_table
-from utils import BLOOD_GROUPS, CONTINENTS
-
-
-# Card Style with Static Shadows (No Hover or 3D Effect)
-# Card Style with Light/Dark Mode Support
-CARD_STYLE_LIGHT = {
-    "box-shadow": "0 8px 16px rgba(0, 0, 0, 0.2)",
-    "border-radius": "12px",
-    "background-color": "#ffffff",
-    "overflow": "hidden",
-    "padding": "10px",
-    "transition": "all 0.3s ease-in-out",
-}
-
-CARD_STYLE_DARK = {
-    "box-shadow": "0 8px 16px rgba(255, 255, 255, 0.1)",
-    "border-radius": "12px",
-    "background-color": "#1e1e1e",
-    "overflow": "hidden",
-    "padding": "10px",
-    "transition": "all 0.3s ease-in-out",
-    "color": "#ffffff"
-}
-
-# Light and Dark Mode Container Styles
-LIGHT_MODE_STYLE = {
-    "background-color": "#E3FDFD", 
-    "padding": "20px", 
-    "min-height": "100vh"
-}
-
-DARK_MODE_STYLE = {
-    "background-color": "#121212", 
-    "padding": "20px", 
-    "min-height": "100vh",
-    "color": "#ffffff"
-}
-
-# Light and Dark Mode Styles for DataTable
-DATATABLE_STYLE_LIGHT = {
-    "backgroundColor": "#ffffff",
-    "color": "#000000",
-    "border": "1px solid #ddd",
-}
-
-DATATABLE_STYLE_DARK = {
-    "backgroundColor": "#1e1e1e",
-    "color": "#ffffff",
-    "border": "1px solid #444",
-}
-
-TOGGLE_LABEL_LIGHT = {"color": "#000000"}  # Black text for light mode
-TOGGLE_LABEL_DARK = {"color": "#ffffff"}  # White text for dark mode
+from export import DATA_EXPORT_FORMATS
+from utils import BLOOD_GROUPS, CONTINENTS, TABLE_COLUMNS
+
+
+# Light/dark card, container, table and toggle styles live in assets/styles.css
+
+# Initial filter values, also used to warm the figure caches at boot
+DEFAULT_BLOOD_TYPES = ['O+']
+DEFAULT_CONTINENT = 'Europe'
+DEFAULT_POPULATION = 1397897720
+# Run sizes offered by the supply simulator
+SIMULATION_RUNS = [10_000, 100_000, 1_000_000]
 
 
 
@@ -67,7 +26,7 @@ def create_layout():
                 dcc.Dropdown(
                     id='blood-types-multi',
                     options=[{'label': bt, 'value': bt} for bt in BLOOD_GROUPS],
-                    value=['O+'],
+                    value=DEFAULT_BLOOD_TYPES,
                     multi=True,
                     clearable=False,
                     style={"width": "100%", "border-radius": "8px", "font-size": "12px", "padding": "3px"}
@@ -78,7 +37,7 @@ def create_layout():
                 dcc.Dropdown(
                     id='continent-dropdown',
                     options=[{'label': c, 'value': c} for c in CONTINENTS],
-                    value='Europe',
+                    value=DEFAULT_CONTINENT,
                     clearable=False,
                     style={"width": "100%", "border-radius": "8px", "font-size": "12px", "padding": "3px"}
                 ),
@@ -87,15 +46,34 @@ def create_layout():
             dcc.Slider(
                 id='population-slider',
                 min=350734,
-                max=1397897720,
-                value=1397897720,
+                max=DEFAULT_POPULATION,
+                value=DEFAULT_POPULATION,
                 marks={int(x): f'{int(x/1e6)}M' for x in [350734, 1e7, 5e7, 1e8, 1e9]},
-                step=1000000
+                # Snap to the marks, which callbacks set to the continent's distinct populations
+                step=None
             ),
             dbc.Button([html.I(className="fas fa-sync-alt mr-2"), "Reset"], id="reset-filters", color="primary", className="mt-3 w-100"),
-            dbc.Button([html.I(className="fas fa-download mr-2"), "Data"], id="btn-download", color="primary", className="mt-2 w-100"),
-            dcc.Download(id="download-data"),
+            dbc.Button([html.I(className="fas fa-download mr-2"), "Data"], id="btn-download", color="primary", className="mt-2 w-100",
+                       href="", external_link=True),
+            dbc.RadioItems(
+                id="data-format",
+                options=[{"label": label, "value": fmt} for fmt, label in [("csv", "CSV"), ("csv.gz", "CSV.gz"), ("parquet", "Parquet")]
+                         if fmt in DATA_EXPORT_FORMATS],
+                value="csv",
+                inline=True,
+                className="text-white mt-1",
+                style={"font-size": "12px"}
+            ),
             dbc.Button([html.I(className="fas fa-camera mr-2"), "Charts"], id="btn-download-charts", color="primary", className="mt-2 w-100"),
+            dbc.RadioItems(
+                id="export-format",
+                options=[{"label": "PNG", "value": "png"}, {"label": "SVG", "value": "svg"}, {"label": "PDF", "value": "pdf"}],
+                value="png",
+                inline=True,
+                className="text-white mt-1",
+                style={"font-size": "12px"}
+            ),
+            dbc.Progress(id="export-progress", value=0, max=1, className="mt-1", style={"height": "6px"}),
             dcc.Download(id="download-charts"),
             dbc.Button([html.I(className="fas fa-info-circle mr-2"), "Info"], id="open-info", color="secondary", className="mt-2 w-100"),
             html.Div(id="loading-message", style={"margin-top": "10px", "color": "#fff", "font-size": "12px"})
@@ -121,6 +99,31 @@ def create_layout():
         size="lg"
     )
 
+    simulator_tab = dbc.Row([
+        dbc.Col(dbc.Card([
+            html.Label("Transfusions per 1,000 people, by recipient type"),
+            dbc.Row([
+                dbc.Col(dbc.InputGroup([
+                    dbc.InputGroupText(bg, style={"width": "48px"}),
+                    dbc.Input(id={"type": "sim-demand", "index": bg}, type="number", value=10, min=0, step=0.5),
+                ], size="sm"), width=6, className="mb-1")
+                for bg in BLOOD_GROUPS
+            ], className="g-1 mb-2"),
+            html.Label("Donor participation (%)"),
+            dbc.Input(id="sim-participation", type="number", value=1.2, min=0, max=100, step=0.1, size="sm", className="mb-2"),
+            html.Label("Participation variation (%)"),
+            dbc.Input(id="sim-participation-variation", type="number", value=15, min=0, step=1, size="sm", className="mb-2"),
+            html.Label("Demand variation (%)"),
+            dbc.Input(id="sim-demand-variation", type="number", value=10, min=0, step=1, size="sm", className="mb-2"),
+            html.Label("Simulations"),
+            dcc.Dropdown(id="sim-runs", options=[{'label': f"{n:,}", 'value': n} for n in SIMULATION_RUNS],
+                         value=SIMULATION_RUNS[1], clearable=False, className="mb-2"),
+            dbc.Button([html.I(className="fas fa-play mr-2"), "Run"], id="sim-run", color="primary", className="w-100"),
+        ], id="card-8", className="card dashboard-card p-3"), md=3, sm=12, className="mb-3"),
+        dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='shortage-chart', style={"height": "420px"}), id='card-9', className="card dashboard-card")),
+                md=9, sm=12, className="mb-3"),
+    ], className="mt-3")
+
     main_content = dbc.Container([
         dbc.Row([
             # Dynamically show/hide toggle button based on sidebar state (handled in callbacks)
@@ -141,53 +144,71 @@ def create_layout():
             id="dark-mode-toggle",
             label="Dark Mode",
             value=False,
-            className="mt-2",
-            style={"color": "#000000","font-weight": "bold"}  # Default color for light mode
+            className="mt-2 dark-mode-toggle"
         ),
         width="auto"
     )
 ], align="center", justify="start"),
 
-                dbc.Row([
-                    dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='choropleth-map', style={"height": "300px"}), id='card-1',style=CARD_STYLE_LIGHT, className="card")), md=4, sm=12, className="mb-3"),
-                    dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='pie-chart', style={"height": "300px"}), id='card-2',style=CARD_STYLE_LIGHT, className="card")), md=4, sm=12, className="mb-3"),
-                    dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='bar-chart', style={"height": "300px"}), id='card-3',style=CARD_STYLE_LIGHT, className="card")), md=4, sm=12, className="mb-3"),
-                ]),
-                dbc.Row([
-                    dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='gauge-chart', style={"height": "300px"}), id='card-4',style=CARD_STYLE_LIGHT, className="card")), md=4, sm=12, className="mb-3"),
-                    dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='scatter-plot', style={"height": "300px"}), id='card-5', style=CARD_STYLE_LIGHT, className="card")), md=4, sm=12, className="mb-3"),
-                    dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='heatmap', style={"height": "300px"}), id='card-6',style=CARD_STYLE_LIGHT, className="card")), md=4, sm=12, className="mb-3"),
-                ]),
-                dbc.Row([
-                    dbc.Col(
-    dcc.Loading(
-        dbc.Card(
-            dash_table.DataTable(
-                id="data-table",
-                columns=[
-                    {"name": i, "id": i}
-                    for i in ["Country", "Population"] + BLOOD_GROUPS + ["Continent", "Rarest_Blood_Type", "Diversity_Index", "Can_Donate_To"]
-                ],
-                data=[],
-                fixed_rows={"headers": True},
-                style_header={"backgroundColor": "#f8f9fa", 
-                        "color": "#000000",         
-                        "fontWeight": "bold",
-                        "textAlign": "center",},
-                style_table={"overflowX": "auto", "maxHeight": "300px", "overflowY": "scroll"},
-                page_size=5,
-                style_cell={"minWidth": "100px", "textAlign": "left"},  # Default cell style
+                dbc.Tabs([
+                    dbc.Tab([
+                        dbc.Row([
+                            dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='choropleth-map', style={"height": "300px"}), id='card-1', className="card dashboard-card")), md=4, sm=12, className="mb-3"),
+                            dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='pie-chart', style={"height": "300px"}), id='card-2', className="card dashboard-card")), md=4, sm=12, className="mb-3"),
+                            dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='bar-chart', style={"height": "300px"}), id='card-3', className="card dashboard-card")), md=4, sm=12, className="mb-3"),
+                        ]),
+                        dbc.Row([
+                            dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='gauge-chart', style={"height": "300px"}), id='card-4', className="card dashboard-card")), md=4, sm=12, className="mb-3"),
+                            dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='scatter-plot', style={"height": "300px"}), id='card-5', className="card dashboard-card")), md=4, sm=12, className="mb-3"),
+                            dbc.Col(dcc.Loading(dbc.Card(dcc.Graph(id='heatmap', style={"height": "300px"}), id='card-6', className="card dashboard-card")), md=4, sm=12, className="mb-3"),
+                        ]),
+                        dbc.Row([
+                            dbc.Col(dcc.Loading(dbc.Card([
+                                dcc.Graph(id='compatibility-chart', style={"height": "300px"}),
+                                html.Div(id='compatibility-readout', className="small px-3 pb-2"),
+                            ], id='card-7', className="card dashboard-card")), width=12, className="mb-3"),
+                        ]),
+                        dbc.Row([
+                            dbc.Col(
+            dcc.Loading(
+                dbc.Card(
+                    dash_table.DataTable(
+                        id="data-table",
+                        columns=[
+                            {"name": i, "id": i}
+                            for i in TABLE_COLUMNS
+                        ],
+                        data=[],
+                        # Paging, sorting and filtering run server-side so only one page is ever sent
+                        page_action="custom",
+                        page_current=0,
+                        sort_action="custom",
+                        sort_mode="multi",
+                        sort_by=[],
+                        filter_action="custom",
+                        filter_query="",
+                        fixed_rows={"headers": True},
+                        style_header={"backgroundColor": "#f8f9fa", 
+                                "color": "#000000",         
+                                "fontWeight": "bold",
+                                "textAlign": "center",},
+                        style_table={"overflowX": "auto", "maxHeight": "300px", "overflowY": "scroll"},
+                        page_size=5,
+                        style_cell={"minWidth": "100px", "textAlign": "left"},  # Default cell style
+                    ),
+                    id="data-table-card",
+                    style={"max-width": "100%", "margin": "0 auto"},
+                    className="card dashboard-card mt-3",
+                )
             ),
-            id="data-table-card",
-            style={**CARD_STYLE_LIGHT, "max-width": "100%", "margin": "0 auto"},
-            className="card mt-3",
-        )
-    ),
-    width=12,
-),
+            width=12,
+        ),
 
 
-                ]),
+                        ]),
+                    ], label="Dashboard", tab_id="tab-dashboard"),
+                    dbc.Tab(simulator_tab, label="Supply Simulator", tab_id="tab-simulator"),
+                ], id="tabs", active_tab="tab-dashboard", className="mb-3"),
                 html.Footer(
                     [
                         html.Span("© 2025 Blood Type Dashboard | Data from Kaggle"),
@@ -205,9 +226,13 @@ def create_layout():
             ], width=12, className="p-3")  # Added padding for content
         ]),
         sidebar,
-        info_modal
-    ], fluid=True, style={**LIGHT_MODE_STYLE, "background-color": "#E3FDFD", "padding": "20px", "min-height": "100vh"}, id="main-container")  # Full-width layout
+        info_modal,
+        dcc.Store(id="page-id")
+    ], fluid=True, className="dashboard", id="main-container")  # Full-width layout
 
     return main_content
 
-layout = create_layout()
\ No newline at end of file
+layout = create_layout()
+
+# Every chart on the page, in layout order; the chart export bundles whichever of them are drawn
+CHART_IDS = [component.id for component in layout._traverse() if isinstance(component, dcc.Graph)]
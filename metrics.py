@@ -0,0 +1,191 @@
+"""Opt-in callback instrumentation, exported in Prometheus text format at /metrics.
+
+Set DASHBOARD_METRICS=1 to enable. When disabled, no Flask hooks or routes are
+installed and ``timer``/``observe`` return immediately.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+import flask
+
+from utils import CACHE_DIR
+
+METRICS_ENABLED = os.environ.get("DASHBOARD_METRICS", "") == "1"
+METRICS_ROUTE = "/metrics"
+PROFILE_ROUTE = "/metrics/profile"
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")
+PROFILE_ENGINES = ["cprofile", "pyinstrument"]
+
+# metric name -> help text; every metric is exported as a Prometheus summary (_sum and _count)
+SUMMARIES = {
+    "dashboard_callback_duration_seconds": "Server time spent handling a Dash callback request",
+    "dashboard_callback_response_bytes": "Size of the Dash callback response body",
+    "dashboard_figure_duration_seconds": "Time to produce a chart figure, including cache lookups",
+}
+
+logger = logging.getLogger(__name__)
+
+_summaries = defaultdict(lambda: [0, 0.0])
+_caches = {}
+_lock = threading.Lock()
+_profile_state = {"armed": None, "last": None}
+_NULL_TIMER = nullcontext()
+
+
+def observe(metric, value, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        entry = _summaries[key]
+        entry[0] += 1
+        entry[1] += value
+
+
+@contextmanager
+def _timer(metric, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(metric, time.perf_counter() - start, **labels)
+
+
+def timer(metric, **labels):
+    return _timer(metric, labels) if METRICS_ENABLED else _NULL_TIMER
+
+
+def register_cache(name, cache_info):
+    """Export hit/miss counts for an ``lru_cache``-style ``cache_info`` callable."""
+    _caches[name] = cache_info
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def render_metrics():
+    from figures import payload_savings
+
+    lines = []
+    with _lock:
+        snapshot = {key: tuple(entry) for key, entry in _summaries.items()}
+    for metric, help_text in SUMMARIES.items():
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary"]
+        for (name, labels), (count, total) in sorted(snapshot.items()):
+            if name == metric:
+                lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+    cache_stats = {name: cache_info() for name, cache_info in _caches.items()}
+    for field, metric_type, help_text in [("hits", "counter", "Cache lookups answered from the cache"),
+                                          ("misses", "counter", "Cache lookups that had to compute the value"),
+                                          ("currsize", "gauge", "Entries currently held in the cache")]:
+        metric = f"dashboard_cache_{field}" + ("_total" if metric_type == "counter" else "")
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {metric_type}"]
+        for name, info in sorted(cache_stats.items()):
+            lines.append(f"{metric}{_format_labels([('cache', name)])} {getattr(info, field)}")
+
+    payload = payload_savings()
+    for field, help_text in [("full_bytes", "Bytes the chart callbacks would have sent as full figures"),
+                             ("sent_bytes", "Bytes the chart callbacks actually sent, counting patches")]:
+        metric = f"dashboard_figure_{field}_total"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter", f"{metric} {payload[field]}"]
+    return "\n".join(lines) + "\n"
+
+
+def _start_profiler(engine):
+    if engine == "pyinstrument":
+        from pyinstrument import Profiler
+        profiler = Profiler()
+    else:
+        profiler = cProfile.Profile()
+    profiler.enable() if engine == "cprofile" else profiler.start()
+    return engine, profiler
+
+
+def _stop_profiler(engine, profiler, label):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{label.replace('/', '_')[:60]}")
+    if engine == "pyinstrument":
+        profiler.stop()
+        path = stem + ".html"
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+        summary = profiler.output_text()
+    else:
+        profiler.disable()
+        path = stem + ".prof"
+        profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(30)
+        summary = out.getvalue()
+    logger.info(f"Wrote {engine} profile of {label} to {path}")
+    _profile_state["last"] = f"{path}\n\n{summary}"
+
+
+def _is_callback_request():
+    return flask.request.path.endswith("_dash-update-component")
+
+
+def _before_request():
+    if not _is_callback_request():
+        return
+    flask.g.metrics_start = time.perf_counter()
+    with _lock:
+        engine, _profile_state["armed"] = _profile_state["armed"], None
+    if engine:
+        flask.g.metrics_profiler = _start_profiler(engine)
+
+
+def _after_request(response):
+    start = flask.g.pop("metrics_start", None)
+    if start is None:
+        return response
+    body = flask.request.get_json(silent=True) or {}
+    label = body.get("output", "unknown")
+    observe("dashboard_callback_duration_seconds", time.perf_counter() - start, callback=label)
+    if not response.is_streamed:
+        observe("dashboard_callback_response_bytes", response.calculate_content_length() or 0, callback=label)
+    profiler = flask.g.pop("metrics_profiler", None)
+    if profiler:
+        _stop_profiler(*profiler, label)
+    return response
+
+
+def _metrics_view():
+    return flask.Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def _profile_view():
+    # POST arms a one-shot profile of the next callback request; GET returns the latest result
+    if flask.request.method == "POST":
+        engine = flask.request.args.get("engine", "cprofile")
+        if engine not in PROFILE_ENGINES:
+            flask.abort(400)
+        with _lock:
+            _profile_state["armed"] = engine
+        return flask.Response(f"Profiling the next callback request with {engine}\n", mimetype="text/plain")
+    return flask.Response(_profile_state["last"] or "No profile captured yet\n", mimetype="text/plain")
+
+
+def init_metrics(server):
+    if not METRICS_ENABLED:
+        return
+    server.before_request(_before_request)
+    server.after_request(_after_request)
+    server.add_url_rule(METRICS_ROUTE, "metrics", _metrics_view)
+    server.add_url_rule(PROFILE_ROUTE, "metrics_profile", _profile_view, methods=["GET", "POST"])
@@ -0,0 +1,133 @@
+"""Monte Carlo blood-supply scenarios: how often can a continent's donors not cover its transfusions?
+
+Each simulated period draws a participation rate and a demand level per
+continent, then the units donated by each blood type and the transfusions
+needed by each recipient type. A continent is short when no assignment of
+donated units to compatible recipients (ABO/Rh, see compatibility.py) covers
+every transfusion.
+
+Countries of a continent share the period's rates, so the sum of their
+binomial supplies and Poisson demands is itself binomial/Poisson with the
+summed pools, and drawing once per continent from those sums is equivalent
+to drawing every country and adding them up. The draws themselves use normal
+approximations of those binomial and Poisson distributions, which are close
+for pools of thousands of people or more but not exact.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from compatibility import COMPATIBILITY_MATRIX
+from utils import BLOOD_GROUPS
+
+SIMULATION_SEED = 0
+# Simulations per vectorized batch; each holds (batch, continents, constraints) Hall-condition sums
+BATCH_SIZE = 10_000
+# Runs with at least this many simulations are split across a process pool started for the run
+POOL_THRESHOLD = 1_000_000
+SIMULATION_WORKERS = int(os.environ.get("SIMULATION_WORKERS", os.cpu_count() or 1))
+
+# transfusions_per_1000: units needed per period per 1,000 people of each recipient type (BLOOD_GROUPS order)
+# participation: mean fraction of people who donate one unit per period
+# participation_cv, demand_cv: period-to-period coefficient of variation of the two rates
+Scenario = namedtuple('Scenario', ['transfusions_per_1000', 'participation', 'participation_cv', 'demand_cv'])
+DEFAULT_SCENARIO = Scenario(transfusions_per_1000=(10.0,) * len(BLOOD_GROUPS), participation=0.012,
+                            participation_cv=0.15, demand_cv=0.1)
+
+
+def _hall_constraints():
+    # Demand is coverable iff every set of recipient types needs no more than its compatible donors
+    # supply (Hall's theorem). Only the largest recipient set per distinct donor set can bind, so
+    # there is one constraint per donor set, plus one per single recipient type for the per-type report.
+    k = len(BLOOD_GROUPS)
+    masks = np.arange(1, 2 ** k)
+    recipient_sets = ((masks[:, None] >> np.arange(k)) & 1).astype(float)
+    donor_sets = np.unique(recipient_sets @ COMPATIBILITY_MATRIX.T.astype(float) > 0, axis=0)
+    # Recipient types all of whose compatible donors are in the donor set
+    closed_sets = ~(~donor_sets[:, :, None] & COMPATIBILITY_MATRIX[None]).any(axis=1)
+    recipients = np.vstack([closed_sets, np.eye(k, dtype=bool)])
+    donors = np.vstack([donor_sets, COMPATIBILITY_MATRIX.T])
+    return recipients.T.astype(float), donors.T.astype(float)
+
+
+_RECIPIENT_SETS, _DONOR_SETS = _hall_constraints()
+_SINGLE_SETS = slice(-len(BLOOD_GROUPS), None)  # the single-recipient-type columns of the set matrices
+
+
+def continent_pools(store):
+    """Continents and their summed per-country donor pools (people per blood type), leaving out the World row."""
+    mask = np.ones(len(store), dtype=bool)
+    world = store.find_country('World')
+    if world is not None:
+        mask[world] = False
+    codes = np.asarray(store.codes['Continent'])[mask]
+    continents = store.categories['Continent']
+    pools = np.asarray(store.donor_pools, dtype=float)[mask]
+    totals = np.column_stack([np.bincount(codes, pools[:, j], len(continents)) for j in range(pools.shape[1])])
+    present = np.bincount(codes, minlength=len(continents)) > 0
+    return list(continents[present]), totals[present]
+
+
+def _gamma(rng, mean, cv, size):
+    if cv <= 0:
+        return np.full(size, mean)
+    shape = 1.0 / cv ** 2
+    return rng.gamma(shape, mean / shape, size)
+
+
+def _simulate_chunk(pools, scenario, n_sims, seed):
+    """Shortage counts over ``n_sims`` periods: (continents,) for any shortage, (continents, types) per recipient type."""
+    rng = np.random.default_rng(seed)
+    rates = np.asarray(scenario.transfusions_per_1000, dtype=float) / 1000
+    n_continents = len(pools)
+    any_short = np.zeros(n_continents, dtype=np.int64)
+    type_short = np.zeros((n_continents, len(BLOOD_GROUPS)), dtype=np.int64)
+
+    for start in range(0, n_sims, BATCH_SIZE):
+        n = min(BATCH_SIZE, n_sims - start)
+        participation = np.clip(_gamma(rng, scenario.participation, scenario.participation_cv, (n, n_continents)), 0.0, 1.0)
+        demand_level = _gamma(rng, 1.0, scenario.demand_cv, (n, n_continents))
+
+        # Normal approximations of Binomial(pool, p) and Poisson(lam); pools here are thousands to billions of people
+        mean_supply = pools[None] * participation[..., None]
+        supply = mean_supply + np.sqrt(mean_supply * (1 - participation[..., None])) * rng.standard_normal(mean_supply.shape)
+        mean_demand = pools[None] * rates * demand_level[..., None]
+        demand = mean_demand + np.sqrt(mean_demand) * rng.standard_normal(mean_demand.shape)
+        supply, demand = np.maximum(supply, 0.0), np.maximum(demand, 0.0)
+
+        # (n, continents, sets): Hall's condition for every set of recipient types at once
+        deficit = demand @ _RECIPIENT_SETS > supply @ _DONOR_SETS
+        any_short += deficit.any(axis=2).sum(axis=0)
+        type_short += deficit[:, :, _SINGLE_SETS].sum(axis=0)
+    return any_short, type_short
+
+
+def simulate_shortages(store, scenario=DEFAULT_SCENARIO, n_sims=100_000, seed=SIMULATION_SEED, use_pool=None):
+    """Per-continent shortage probabilities for ``scenario`` over ``n_sims`` simulated periods.
+
+    Returns a DataFrame indexed by continent with Shortage_Probability (any
+    recipient type left short) and, per recipient type, the probability that
+    its own compatible donors can't cover it. ``use_pool`` defaults to
+    splitting runs of POOL_THRESHOLD or more simulations across worker processes.
+    """
+    continents, pools = continent_pools(store)
+    use_pool = n_sims >= POOL_THRESHOLD if use_pool is None else use_pool
+    workers = SIMULATION_WORKERS if use_pool else 1
+    chunk_sizes = [n_sims // workers + (i < n_sims % workers) for i in range(workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+
+    if workers > 1:
+        # Started per run rather than kept: runs this large are rare, and an idle pool in every web worker is not
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_chunk, [pools] * workers, [scenario] * workers, chunk_sizes, seeds))
+    else:
+        results = [_simulate_chunk(pools, scenario, n_sims, seeds[0])]
+
+    any_short = sum(r[0] for r in results)
+    type_short = sum(r[1] for r in results)
+    frame = pd.DataFrame(type_short / n_sims, index=pd.Index(continents, name='Continent'), columns=BLOOD_GROUPS)
+    frame.insert(0, 'Shortage_Probability', any_short / n_sims)
+    return frame
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class WeightedPrefixStats:
+    """Weighted means, covariance and correlation of every prefix of a sequence of rows.
+
+    The weights, weighted values, weighted extra columns and the weighted upper
+    triangle of the cross products are stacked into one matrix and summed
+    cumulatively in a single pass, so the statistics of the first ``n`` rows
+    are O(1) lookups afterwards. Missing weights count as zero.
+    """
+
+    def __init__(self, values, weights, extra=None):
+        values = np.asarray(values, dtype=float)
+        n, k = values.shape
+        weights = np.nan_to_num(np.asarray(weights, dtype=float))
+        extra = np.empty((n, 0)) if extra is None else np.asarray(extra, dtype=float)
+        if extra.ndim == 1:
+            extra = extra[:, None]
+        self._k = k
+        self._e = extra.shape[1]
+        self._upper = np.triu_indices(k)
+
+        features = np.concatenate([np.ones((n, 1)), values, extra, values[:, self._upper[0]] * values[:, self._upper[1]]], axis=1)
+        features *= weights[:, None]
+        self._sums = np.zeros((n + 1, features.shape[1]))
+        np.cumsum(features, axis=0, out=self._sums[1:])
+
+    def weight(self, n):
+        return float(self._sums[n, 0])
+
+    def mean(self, n):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._sums[n, 1:1 + self._k] / self._sums[n, 0]
+
+    def extra_mean(self, n):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._sums[n, 1 + self._k:1 + self._k + self._e] / self._sums[n, 0]
+
+    def cov(self, n):
+        mean = self.mean(n)
+        second = np.empty((self._k, self._k))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            second[self._upper] = self._sums[n, 1 + self._k + self._e:] / self._sums[n, 0]
+        second.T[self._upper] = second[self._upper]
+        return second - np.outer(mean, mean)
+
+    def corr(self, n):
+        cov = self.cov(n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+            return np.clip(cov / np.outer(std, std), -1.0, 1.0)
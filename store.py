@@ -0,0 +1,163 @@
+import glob
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from utils import BLOOD_GROUPS, CACHE_DIR, DATA_FILE, DONOR_POOL_COLUMNS, TABLE_COLUMNS, load_and_preprocess_data, source_fingerprint
+
+# Bump whenever the on-disk layout written by BloodTypeStore.save changes
+STORE_VERSION = 3
+CATEGORICAL_COLUMNS = ["Region", "Country", "ISO3", "Continent", "Rarest_Blood_Type", "Can_Donate_To"]
+# Percentages are held as float32; round on the way out so 34.1 doesn't surface as 34.099998
+PERCENT_DECIMALS = 4
+ARRAYS = ["population", "percentages", "donor_pools", "diversity"]
+
+logger = logging.getLogger(__name__)
+
+
+class BloodTypeStore:
+    """Typed, column-oriented copy of the preprocessed dataset.
+
+    Strings are stored as categorical codes, blood-group percentages as one
+    float32 matrix and donor pools as one int64 matrix. A saved store is opened
+    with ``mmap_mode='r'``, so every worker process maps the same pages instead
+    of holding a private pandas frame.
+    """
+
+    def __init__(self, population, percentages, donor_pools, diversity, codes, categories):
+        self.population = population
+        self.percentages = percentages
+        self.donor_pools = donor_pools
+        self.diversity = diversity
+        self.codes = codes
+        self.categories = categories
+        self._category_codes = {col: {value: i for i, value in enumerate(values)} for col, values in categories.items()}
+
+    @classmethod
+    def from_frame(cls, df):
+        codes, categories = {}, {}
+        for col in CATEGORICAL_COLUMNS:
+            categorical = pd.Categorical(df[col])
+            codes[col] = categorical.codes
+            categories[col] = np.array([sys.intern(str(c)) for c in categorical.categories], dtype=object)
+        return cls(
+            population=df["Population"].to_numpy(dtype=np.float64),
+            percentages=df[BLOOD_GROUPS].to_numpy(dtype=np.float32),
+            donor_pools=df[DONOR_POOL_COLUMNS].fillna(0).to_numpy(dtype=np.int64),
+            diversity=df["Diversity_Index"].to_numpy(dtype=np.float64),
+            codes=codes,
+            categories=categories,
+        )
+
+    @classmethod
+    def open(cls, path, mmap_mode="r"):
+        with open(os.path.join(path, "categories.json")) as f:
+            categories = {col: np.array([sys.intern(c) for c in values], dtype=object) for col, values in json.load(f).items()}
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAYS}
+        codes = {col: np.load(os.path.join(path, f"codes_{col}.npy"), mmap_mode=mmap_mode) for col in CATEGORICAL_COLUMNS}
+        return cls(codes=codes, categories=categories, **arrays)
+
+    def save(self, path):
+        # Write into a sibling temp directory and rename, so readers never see a partial store
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=parent, suffix=".tmp")
+        try:
+            for name in ARRAYS:
+                np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(self, name))
+            for col in CATEGORICAL_COLUMNS:
+                np.save(os.path.join(tmp_path, f"codes_{col}.npy"), self.codes[col])
+            with open(os.path.join(tmp_path, "categories.json"), "w") as f:
+                json.dump({col: list(values) for col, values in self.categories.items()}, f)
+            os.rename(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+
+    def __len__(self):
+        return len(self.population)
+
+    @property
+    def continents(self):
+        return list(self.categories["Continent"])
+
+    def positions(self, col, value):
+        code = self._category_codes[col].get(value)
+        if code is None:
+            return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(self.codes[col] == code)
+
+    def continent_positions(self, continent):
+        return self.positions("Continent", continent)
+
+    def find_country(self, name):
+        rows = self.positions("Country", name)
+        return int(rows[0]) if len(rows) else None
+
+    def percentage(self, position, blood_type):
+        return float(round(float(self.percentages[position, BLOOD_GROUPS.index(blood_type)]), PERCENT_DECIMALS))
+
+    def max_population(self):
+        return float(np.nanmax(self.population)) if len(self) else 0.0
+
+    def decode(self, col, positions):
+        codes = np.asarray(self.codes[col][positions])
+        categories = self.categories[col]
+        if len(categories) == 0:
+            return np.full(len(codes), None, dtype=object)
+        return np.where(codes < 0, None, categories.take(np.maximum(codes, 0)))
+
+    def frame(self, positions=None, columns=None):
+        """Materialize ``columns`` (default TABLE_COLUMNS) for ``positions`` as a DataFrame indexed by row position."""
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions, dtype=np.intp)
+        columns = TABLE_COLUMNS if columns is None else columns
+        data = {}
+        for col in columns:
+            if col in CATEGORICAL_COLUMNS:
+                data[col] = self.decode(col, positions)
+            elif col == "Population":
+                data[col] = np.asarray(self.population[positions])
+            elif col == "Diversity_Index":
+                data[col] = np.asarray(self.diversity[positions])
+            elif col in BLOOD_GROUPS:
+                values = self.percentages[positions, BLOOD_GROUPS.index(col)]
+                data[col] = np.round(values.astype(np.float64), PERCENT_DECIMALS)
+            elif col in DONOR_POOL_COLUMNS:
+                data[col] = np.asarray(self.donor_pools[positions, DONOR_POOL_COLUMNS.index(col)])
+            else:
+                raise KeyError(col)
+        return pd.DataFrame(data, index=positions, columns=columns)
+
+
+def store_path(file_path=DATA_FILE):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-store-v{STORE_VERSION}-{source_fingerprint(file_path)[:16]}")
+
+
+def save_store(store, path):
+    """Persist ``store`` at ``path`` and drop older stores of the same source; returns the store to serve."""
+    try:
+        store.save(path)
+    except OSError as e:
+        logger.warning(f"Could not persist store to {path}, keeping it in process memory: {e}")
+        return store
+    stem = os.path.basename(path).split("-store-v")[0]
+    # Workers still serving an older store keep their open mmaps after the files are unlinked
+    for stale in glob.glob(os.path.join(CACHE_DIR, f"{stem}-store-v*")):
+        if stale != path and not stale.endswith(".tmp"):
+            shutil.rmtree(stale, ignore_errors=True)
+    return BloodTypeStore.open(path)
+
+
+def load_store(file_path=DATA_FILE):
+    path = store_path(file_path)
+    if not os.path.isdir(path):
+        return save_store(BloodTypeStore.from_frame(load_and_preprocess_data(file_path)), path)
+    return BloodTypeStore.open(path)
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from coalesce import SUPERSEDED, Coalescer, page_key
+
+
+def run_queued(coalescer, keys, full=None):
+    """Start one call per key while a first call on keys[0] is in flight; return each call's result.
+
+    Queued calls return their position, or (position, full) when ``full`` gives each call's flag.
+    """
+    results = {}
+    started = threading.Event()
+    flags = [True] * len(keys) if full is None else full
+
+    def slow(flag):
+        started.set()
+        time.sleep(0.2)
+        return "first"
+
+    def queued(i):
+        return lambda flag: i if full is None else (i, flag)
+
+    threads = [threading.Thread(target=lambda: results.__setitem__(0, coalescer.run(keys[0], slow, flags[0])))]
+    threads[0].start()
+    started.wait()
+    for i, key in enumerate(keys[1:], start=1):
+        threads.append(threading.Thread(
+            target=lambda i=i, key=key: results.__setitem__(i, coalescer.run(key, queued(i), flags[i]))))
+        threads[-1].start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+    return [results[i] for i in range(len(keys))]
+
+
+def test_only_latest_queued_call_runs():
+    key = page_key("page-a", "pie_figure")
+    assert run_queued(Coalescer(), [key, key, key, key]) == ["first", SUPERSEDED, SUPERSEDED, 3]
+
+
+def test_pages_do_not_supersede_each_other():
+    a, b = page_key("page-a", "pie_figure"), page_key("page-b", "pie_figure")
+    assert run_queued(Coalescer(), [a, a, b]) == ["first", 1, 2]
+
+
+def test_calls_without_page_id_always_run():
+    assert page_key(None, "pie_figure") is None
+    assert run_queued(Coalescer(), [None, None, None]) == ["first", 1, 2]
+
+
+def test_dropped_full_call_makes_next_call_full():
+    key = page_key("page-a", "choropleth_figure")
+    # Slider, continent change (dropped), slider again: the last call must send the whole figure
+    assert run_queued(Coalescer(), [key, key, key], full=[False, True, False]) == ["first", SUPERSEDED, (2, True)]
+    assert run_queued(Coalescer(), [key, key, key], full=[False, False, False]) == ["first", SUPERSEDED, (2, False)]
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from compatibility import continent_eligible_donors
+from store import BloodTypeStore
+from utils import BLOOD_COMPATIBILITY, BLOOD_GROUPS, build_aggregate_index, preprocess
+
+COUNTRIES = ["France", "Germany", "Italy", "Spain", "Poland", "Kenya", "Nigeria"]
+
+
+def make_index():
+    rng = np.random.default_rng(2)
+    shares = rng.dirichlet(np.ones(len(BLOOD_GROUPS)), len(COUNTRIES)) * 100
+    df = pd.DataFrame(shares, columns=BLOOD_GROUPS)
+    df.insert(0, "Country", COUNTRIES)
+    df.insert(1, "Population", rng.integers(1_000, 10_000_000, len(COUNTRIES)).astype(float))
+    df["Rarest_Blood_Type"] = np.asarray(BLOOD_GROUPS)[shares.argmin(axis=1)]
+    df["Diversity_Index"] = rng.random(len(COUNTRIES))
+    df = preprocess(df)
+    return df, build_aggregate_index(BloodTypeStore.from_frame(df))
+
+
+def test_eligible_donors_match_brute_force_sum():
+    df, index = make_index()
+    europe = df[df["Continent"] == "Europe"]
+    for pop_cap in [0, *sorted(europe["Population"]), np.inf]:
+        rows = europe[europe["Population"] <= pop_cap]
+        for recipient in BLOOD_GROUPS:
+            expected = sum(rows[f"Donor_Pool_{donor}"].sum() for donor in BLOOD_GROUPS if recipient in BLOOD_COMPATIBILITY[donor])
+            assert continent_eligible_donors(index["Europe"], recipient, pop_cap) == expected
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+import store as store_module
+import utils
+from dataset import STORE_COLUMNS, DataManager
+from store import BloodTypeStore
+from utils import preprocess
+
+SOURCE = pd.DataFrame({
+    "Country": ["France", "Germany", "Italy", "Kenya", "Nigeria", "Brazil", "Chile"],
+    "Population": [68e6, 84e6, 59e6, 55e6, 218e6, 215e6, 19e6],
+    "O+": [36.0, 35.0, 39.0, 46.0, 51.3, 36.0, 85.5],
+    "A+": [37.0, 37.0, 36.0, 23.0, 22.4, 34.0, 8.7],
+    "B+": [9.0, 9.0, 7.5, 22.0, 20.7, 8.0, 3.4],
+    "AB+": [3.0, 4.0, 2.5, 4.0, 2.6, 2.5, 1.0],
+    "O-": [6.0, 6.0, 7.0, 2.0, 1.6, 9.0, 1.2],
+    "A-": [7.0, 6.0, 6.0, 1.6, 0.7, 8.0, 0.1],
+    "B-": [1.0, 2.0, 1.5, 1.0, 0.5, 2.0, 0.06],
+    "AB-": [1.0, 1.0, 0.5, 0.4, 0.2, 0.5, 0.04],
+    "Rarest_Blood_Type": ["AB-"] * 7,
+    "Diversity_Index": [1.5, 1.5, 1.5, 1.4, 1.3, 1.6, 0.6],
+})
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    for module in (utils, store_module):
+        monkeypatch.setattr(module, "CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path
+
+
+def test_refresh_store_matches_full_preprocess(cache_dir):
+    file_path = str(cache_dir / "processed.csv")
+    SOURCE.to_csv(file_path, index=False)
+    manager = DataManager(file_path)
+
+    edited = SOURCE.copy()
+    edited.loc[edited["Country"] == "Italy", ["O+", "A+"]] = [40.0, 35.0]
+    peru = SOURCE[SOURCE["Country"] == "Chile"].assign(Country="Peru", Population=34e6)
+    edited = pd.concat([edited, peru], ignore_index=True)
+    edited.to_csv(file_path, index=False)
+
+    assert manager.reload() == {"Europe", "South America"}
+    full = BloodTypeStore.from_frame(preprocess(pd.read_csv(file_path)))
+    pd.testing.assert_frame_equal(manager.snapshot.store.frame(columns=STORE_COLUMNS), full.frame(columns=STORE_COLUMNS))
+    assert manager.snapshot.store.percentage(manager.snapshot.store.find_country("Italy"), "O+") == 40.0
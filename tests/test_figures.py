@@ -0,0 +1,13 @@
+import plotly.express as px
+
+from figures import figure_payload
+
+
+def test_patch_resends_data_dependent_layout():
+    fig = px.bar({"Region": ["a", "b"], "O+": [1.0, 2.0]}, x="Region", y="O+", title="O+ in Europe")
+    payload = figure_payload(fig, 'bar')
+    operations = {tuple(op['location']): op['params']['value'] for op in payload.patch.to_plotly_json()['operations']}
+    assert operations[('layout', 'xaxis')]['title']['text'] == "Region"
+    assert operations[('layout', 'title')]['text'] == "O+ in Europe"
+    assert ('layout', 'template') not in operations
+    assert payload.patch_bytes < payload.figure_bytes
@@ -0,0 +1,58 @@
+from collections import deque
+
+import numpy as np
+
+from compatibility import COMPATIBILITY_MATRIX
+from simulation import _SINGLE_SETS, _hall_constraints
+
+
+def max_flow(capacity, source, sink):
+    """Edmonds-Karp on a dense capacity matrix."""
+    residual = capacity.copy()
+    flow = 0
+    while True:
+        parent = {source: None}
+        queue = deque([source])
+        while queue and sink not in parent:
+            node = queue.popleft()
+            for nxt in np.flatnonzero(residual[node] > 0):
+                if nxt not in parent:
+                    parent[nxt] = node
+                    queue.append(nxt)
+        if sink not in parent:
+            return flow
+        path, node = [], sink
+        while parent[node] is not None:
+            path.append((parent[node], node))
+            node = parent[node]
+        pushed = min(residual[u, v] for u, v in path)
+        for u, v in path:
+            residual[u, v] -= pushed
+            residual[v, u] += pushed
+        flow += pushed
+
+
+def coverable(supply, demand):
+    # source -> donor types -> compatible recipient types -> sink
+    k = len(supply)
+    source, sink = 0, 2 * k + 1
+    capacity = np.zeros((2 * k + 2, 2 * k + 2), dtype=np.int64)
+    capacity[source, 1:k + 1] = supply
+    capacity[1:k + 1, k + 1:2 * k + 1] = COMPATIBILITY_MATRIX * (supply.sum() + demand.sum())
+    capacity[k + 1:2 * k + 1, sink] = demand
+    return max_flow(capacity, source, sink) == demand.sum()
+
+
+def test_hall_constraints_match_max_flow():
+    recipient_sets, donor_sets = _hall_constraints()
+    rng = np.random.default_rng(0)
+    outcomes = set()
+    for _ in range(300):
+        supply, demand = rng.integers(0, 12, 8), rng.integers(0, 12, 8)
+        deficit = demand @ recipient_sets > supply @ donor_sets
+        feasible = coverable(supply, demand)
+        assert (not deficit.any()) == feasible
+        outcomes.add(feasible)
+        # Per-type columns: a recipient type short even with every compatible donor to itself
+        np.testing.assert_array_equal(deficit[_SINGLE_SETS], demand > supply @ COMPATIBILITY_MATRIX)
+    assert outcomes == {True, False}
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from stats import WeightedPrefixStats
+from store import BloodTypeStore
+from utils import BLOOD_GROUPS, build_aggregate_index, preprocess
+
+
+def make_store(countries):
+    rng = np.random.default_rng(0)
+    shares = rng.dirichlet(np.ones(len(BLOOD_GROUPS)), len(countries)) * 100
+    df = pd.DataFrame(shares, columns=BLOOD_GROUPS)
+    df.insert(0, "Country", countries)
+    df.insert(1, "Population", rng.integers(1_000, 10_000_000, len(countries)).astype(float))
+    df["Rarest_Blood_Type"] = np.asarray(BLOOD_GROUPS)[shares.argmin(axis=1)]
+    df["Diversity_Index"] = rng.random(len(countries))
+    return BloodTypeStore.from_frame(preprocess(df))
+
+
+def test_prefix_stats_match_numpy():
+    rng = np.random.default_rng(1)
+    values, weights, extra = rng.random((20, 3)), rng.random(20), rng.random(20)
+    stats = WeightedPrefixStats(values, weights, extra=extra)
+    for n in (1, 7, 20):
+        np.testing.assert_allclose(stats.mean(n), np.average(values[:n], axis=0, weights=weights[:n]))
+        np.testing.assert_allclose(stats.extra_mean(n), [np.average(extra[:n], weights=weights[:n])])
+        np.testing.assert_allclose(stats.cov(n), np.cov(values[:n].T, aweights=weights[:n], bias=True), atol=1e-12)
+
+
+def test_prefix_stats_without_rows():
+    stats = WeightedPrefixStats(np.empty((0, 3)), np.empty(0), extra=np.empty(0))
+    assert stats.weight(0) == 0
+    assert np.isnan(stats.mean(0)).all()
+    assert np.isnan(stats.extra_mean(0)).all()
+
+
+def test_aggregate_index_with_empty_continent():
+    # No row is tagged "Unknown" or with most other continents
+    store = make_store(["France", "Germany", "Italy"])
+    index = build_aggregate_index(store)
+    assert index["Unknown"].count(1e12) == 0
+    assert np.isnan(index["Unknown"].diversity(1e12))
+    assert index["Europe"].count(1e12) == 3
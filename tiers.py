@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+from store import PERCENT_DECIMALS
+from utils import BLOOD_GROUPS
+
+# Aggregation tiers, finest first; every row belongs to one group at each tier
+TIERS = ["Region", "Country", "Continent"]
+# Per-country columns, carried by the tiers at or below Country
+COUNTRY_COLUMNS = ["ISO3"]
+# Most bars, points or locations a chart draws; a tier is only used while it stays under this
+MAX_TIER_ITEMS = 200
+# Each discrete color is its own trace and legend entry
+MAX_LEGEND_ITEMS = 60
+BAR_TOP_N = 25
+
+
+def tier_size(store, positions, tier):
+    return len(np.unique(store.codes[tier][positions]))
+
+
+def data_tiers(store):
+    # Country-level files fill Region with the country name, so their finest tier is Country
+    return TIERS if len(store.categories["Region"]) > len(store.categories["Country"]) else TIERS[1:]
+
+
+def pick_tier(store, positions, max_items=MAX_TIER_ITEMS, tiers=None):
+    """The finest of ``tiers`` (default: those the data has) with at most ``max_items`` groups among ``positions``."""
+    tiers = tiers or data_tiers(store)
+    for tier in tiers[:-1]:
+        if tier_size(store, positions, tier) <= max_items:
+            return tier
+    return tiers[-1]
+
+
+def _weighted(group, values, weights, n_groups):
+    # Per-group weighted mean of each column of ``values``
+    totals = np.bincount(group, weights, n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.column_stack([np.bincount(group, values[:, j] * weights, n_groups) for j in range(values.shape[1])]) / totals[:, None]
+
+
+def _finish(frame, shares, diversity):
+    frame[BLOOD_GROUPS] = np.round(shares, PERCENT_DECIMALS)
+    frame["Rarest_Blood_Type"] = np.asarray(BLOOD_GROUPS)[np.nan_to_num(shares, nan=np.inf).argmin(axis=1)]
+    frame["Diversity_Index"] = diversity
+    return frame
+
+
+def aggregate_tier(store, positions, tier):
+    """One row per ``tier`` group among ``positions``, with population-weighted blood-group shares.
+
+    Groups keep the order in which they first appear in ``positions`` and carry
+    the labels of their coarser tiers (and COUNTRY_COLUMNS below Continent). A group whose rows all have zero
+    population is averaged unweighted.
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    codes = np.asarray(store.codes[tier][positions])
+    _, first, group = np.unique(codes, return_index=True, return_inverse=True)
+    # Renumber groups by first appearance
+    order = np.argsort(first, kind='mergesort')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    group, first = rank[group.ravel()], first[order]
+    n_groups = len(first)
+
+    population = np.nan_to_num(np.asarray(store.population[positions], dtype=float))
+    group_population = np.bincount(group, population, n_groups)
+    weights = np.where(group_population[group] > 0, population, 1.0)
+
+    values = np.asarray(store.percentages[positions], dtype=float)
+    diversity = np.nan_to_num(np.asarray(store.diversity[positions], dtype=float))[:, None]
+    labels = TIERS[TIERS.index(tier):]
+    if tier != "Continent":
+        labels = labels[:-1] + COUNTRY_COLUMNS + labels[-1:]
+    frame = pd.DataFrame({col: store.decode(col, positions[first]) for col in labels})
+    frame["Population"] = group_population
+    return _finish(frame, _weighted(group, values, weights, n_groups), _weighted(group, diversity, weights, n_groups)[:, 0])
+
+
+def top_n_with_other(tier_frame, tier, n=BAR_TOP_N):
+    """Keep the ``n`` most populous groups and fold the rest into one population-weighted "Other (k)" row."""
+    if len(tier_frame) <= n + 1:
+        return tier_frame
+    top = tier_frame['Population'].nlargest(n, keep='first').index
+    keep = tier_frame.index.isin(top)
+    rest = tier_frame[~keep]
+
+    weights = rest['Population'].to_numpy(dtype=float)
+    if weights.sum() <= 0:
+        weights = np.ones(len(rest))
+    group = np.zeros(len(rest), dtype=np.intp)
+    other = pd.DataFrame({tier: [f"Other ({len(rest)})"], "Population": [rest['Population'].sum()]})
+    other = _finish(other, _weighted(group, rest[BLOOD_GROUPS].to_numpy(dtype=float), weights, 1),
+                    _weighted(group, rest[["Diversity_Index"]].to_numpy(dtype=float), weights, 1)[:, 0])
+    return pd.concat([tier_frame[keep], other], ignore_index=True)
@@ -1,21 +1,117 @@
+import numpy as np
 import pandas as pd
+import glob
+import hashlib
+import json
+import math
+import os
+import pickle
+import re
+import tempfile
 import pycountry_convert as pc
-from functools import lru_cache
+from stats import WeightedPrefixStats
 import logging
 
 # Constants
 BLOOD_GROUPS = ["O+", "A+", "B+", "AB+", "O-", "A-", "B-", "AB-"]
 CONTINENTS = ["Europe", "Africa", "Asia", "South America", "North America", "Oceania", "Unknown"]
+DONOR_POOL_COLUMNS = [f"Donor_Pool_{bg}" for bg in BLOOD_GROUPS]
+# Donor type -> recipient types it can give red cells to (ABO/Rh)
+BLOOD_COMPATIBILITY = {
+    'O+': ['O+', 'A+', 'B+', 'AB+'], 'O-': BLOOD_GROUPS,
+    'A+': ['A+', 'AB+'], 'A-': ['A+', 'A-', 'AB+', 'AB-'],
+    'B+': ['B+', 'AB+'], 'B-': ['B+', 'B-', 'AB+', 'AB-'],
+    'AB+': ['AB+'], 'AB-': ['AB+', 'AB-']
+}
+TABLE_COLUMNS = ["Country", "Population"] + BLOOD_GROUPS + ["Continent", "Rarest_Blood_Type", "Diversity_Index", "Can_Donate_To"]
+# DataTable filter_query operators, longest-prefix first so "ge" wins over "gt"/"eq"
+FILTER_OPERATORS = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'], ['ne ', '!='], ['eq ', '='], ['contains '], ['datestartswith ']]
+# Footnote markers ("[12]", "[citation needed]") and stray bytes the raw exports leave in country names
+COUNTRY_NAME_NOISE = r"\[[^\]]*\]|[\ufffd\xa0]"
+DATA_FILE = "Data/processed_blood_type_data_with_continent.csv"  # Adjust path as needed
+CACHE_DIR = os.path.join("Data", ".cache")
+# Bump whenever preprocess() changes the columns it derives, to invalidate old artifacts
+PREPROCESS_VERSION = 3
 # Configure logger
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
-@lru_cache(maxsize=1)
-@lru_cache(maxsize=1)
-def load_and_preprocess_data():
-    file_path = "Data/processed_blood_type_data_with_continent.csv"  # Adjust path as needed
-    df = pd.read_csv(file_path)
+def clean_country_name(country_name):
+    return re.sub(COUNTRY_NAME_NOISE, "", str(country_name)).strip()
 
+
+def country_to_continent(country_name):
+    try:
+        country_code = pc.country_name_to_country_alpha2(clean_country_name(country_name), cn_name_format="default")
+        continent_code = pc.country_alpha2_to_continent_code(country_code)
+        return pc.convert_continent_code_to_continent_name(continent_code)
+    except:
+        return "Unknown"
+
+
+def country_to_iso3(country_name):
+    # "" for names pycountry can't resolve, such as the World row; the map leaves those out
+    try:
+        return pc.country_name_to_country_alpha3(clean_country_name(country_name), cn_name_format="default")
+    except KeyError:
+        return ""
+
+
+def country_continent_table(countries):
+    # One pycountry lookup per distinct name instead of one per row
+    return {name: country_to_continent(name) for name in pd.unique(countries)}
+
+
+def country_iso3_table(countries):
+    table = {name: country_to_iso3(name) for name in pd.unique(countries)}
+    unresolved = sorted(name for name, code in table.items() if not code and name != 'World')
+    if unresolved:
+        logger.warning(f"No ISO-3 code for {len(unresolved)} countries, left off the map: {unresolved}")
+    return table
+
+
+def source_fingerprint(file_path):
+    """SHA-256 of ``file_path``, re-hashed only when its mtime or size changed."""
+    stat = os.stat(file_path)
+    manifest_path = os.path.join(CACHE_DIR, os.path.basename(file_path) + ".fingerprint.json")
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['mtime_ns'] == stat.st_mtime_ns and manifest['size'] == stat.st_size:
+            return manifest['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    manifest = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest.hexdigest()}
+    try:
+        write_atomic(manifest_path, json.dumps(manifest).encode())
+    except OSError as e:
+        logger.warning(f"Could not write fingerprint for {file_path}: {e}")
+    return manifest['sha256']
+
+
+def write_atomic(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def preprocessed_artifact_path(file_path):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-v{PREPROCESS_VERSION}-{source_fingerprint(file_path)[:16]}.pkl")
+
+
+def preprocess(df):
     for col in BLOOD_GROUPS:
         df[col] = df[col].astype(float)
 
@@ -24,25 +120,168 @@ def load_and_preprocess_data():
     if (df['Percent_Error'] > 5).any():
         logger.warning("Some countries have significant percentage discrepancies.")
 
-    def country_to_continent(country_name):
+    df['Continent'] = df['Country'].map(country_continent_table(df['Country']))
+    # Resolved once here so the map never matches free-text names; ingest.py already writes the column
+    if 'ISO3' not in df:
+        df['ISO3'] = df['Country'].map(country_iso3_table(df['Country']))
+    df['ISO3'] = df['ISO3'].fillna('')
+    # Country-level files are their own finest tier; sub-national files carry a Region column
+    if 'Region' not in df:
+        df['Region'] = df['Country']
+
+    can_donate_to = {donor: ', '.join(recipients) for donor, recipients in BLOOD_COMPATIBILITY.items()}
+    df['Can_Donate_To'] = df['Rarest_Blood_Type'].map(can_donate_to).fillna('')
+
+    donor_pools = (df['Population'].to_numpy()[:, None] * df[BLOOD_GROUPS].to_numpy() / 100).round()
+    df[DONOR_POOL_COLUMNS] = pd.DataFrame(donor_pools, index=df.index)
+
+    return df
+
+
+def load_and_preprocess_data(file_path=DATA_FILE):
+    # Reuse the preprocessed snapshot for this exact CSV content if one exists
+    artifact_path = preprocessed_artifact_path(file_path)
+    if os.path.exists(artifact_path):
         try:
-            country_code = pc.country_name_to_country_alpha2(country_name, cn_name_format="default")
-            continent_code = pc.country_alpha2_to_continent_code(country_code)
-            return pc.convert_continent_code_to_continent_name(continent_code)
-        except:
-            return "Unknown"
-
-    df['Continent'] = df['Country'].apply(country_to_continent)
-
-    blood_compatibility = {
-        'O+': ['O+', 'A+', 'B+', 'AB+'], 'O-': BLOOD_GROUPS,
-        'A+': ['A+', 'AB+'], 'A-': ['A+', 'A-', 'AB+', 'AB-'],
-        'B+': ['B+', 'AB+'], 'B-': ['B+', 'B-', 'AB+', 'AB-'],
-        'AB+': ['AB+'], 'AB-': ['AB+', 'AB-']
-    }
-    df['Can_Donate_To'] = df['Rarest_Blood_Type'].map(lambda x: ', '.join(blood_compatibility.get(x, [])))
-
-    for bg in BLOOD_GROUPS:
-        df[f'Donor_Pool_{bg}'] = (df['Population'] * df[bg] / 100).round()
-
-    return df
\ No newline at end of file
+            return pd.read_pickle(artifact_path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable preprocessed artifact {artifact_path}: {e}")
+
+    df = preprocess(pd.read_csv(file_path))
+
+    try:
+        write_atomic(artifact_path, pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+        stem = os.path.basename(artifact_path).split("-v")[0]
+        for stale in glob.glob(os.path.join(CACHE_DIR, f"{stem}-v*.pkl")):
+            if stale != artifact_path:
+                os.remove(stale)
+    except OSError as e:
+        logger.warning(f"Could not write preprocessed artifact {artifact_path}: {e}")
+    return df
+
+
+class ContinentIndex:
+    """Population-sorted rows of one continent with population-weighted prefix statistics.
+
+    Any population cap maps to a prefix of the sorted rows, so weighted means,
+    the rarest type, the correlation matrix and the mean Diversity_Index come
+    from a binary search plus O(1) arithmetic.
+    """
+
+    def __init__(self, store, positions):
+        self.store = store
+        self.positions = positions[np.argsort(store.population[positions], kind='mergesort')]
+        self.populations = np.asarray(store.population[self.positions], dtype=float)
+
+        self._stats = WeightedPrefixStats(store.percentages[self.positions], self.populations,
+                                          extra=store.diversity[self.positions])
+        self._pools = np.zeros((len(self.positions) + 1, len(BLOOD_GROUPS)))
+        np.cumsum(np.asarray(store.donor_pools[self.positions], dtype=float), axis=0, out=self._pools[1:])
+
+    def count(self, pop_cap):
+        return int(np.searchsorted(self.populations, pop_cap, side='right'))
+
+    def snap(self, pop_cap):
+        """The largest population <= ``pop_cap`` (0.0 if none): every cap with the same matching rows snaps to it."""
+        n = self.count(pop_cap)
+        return float(self.populations[n - 1]) if n else 0.0
+
+    def breakpoints(self, max_points=None):
+        """Distinct populations, i.e. the caps at which the matching rows change.
+
+        With ``max_points``, an evenly spaced (by rank) subset that keeps the smallest and largest.
+        """
+        points = np.unique(self.populations[~np.isnan(self.populations)])
+        if max_points and len(points) > max_points:
+            points = points[np.unique(np.linspace(0, len(points) - 1, max_points).round().astype(int))]
+        return points
+
+    def row_positions(self, pop_cap):
+        # Restore the original (CSV) row order for tables and per-country charts
+        return np.sort(self.positions[:self.count(pop_cap)])
+
+    def rows(self, pop_cap, columns=None):
+        return self.store.frame(self.row_positions(pop_cap), columns)
+
+    def means(self, pop_cap):
+        return pd.Series(self._stats.mean(self.count(pop_cap)), index=BLOOD_GROUPS)
+
+    def diversity(self, pop_cap):
+        return float(self._stats.extra_mean(self.count(pop_cap))[0])
+
+    def pool_totals(self, pop_cap):
+        return self._pools[self.count(pop_cap)]
+
+    def donor_pools(self, pop_cap):
+        return pd.Series(self.pool_totals(pop_cap), index=BLOOD_GROUPS)
+
+    def rarest(self, pop_cap):
+        means = self.means(pop_cap)
+        if means.isna().all():
+            raise ValueError("No countries match the current filters")
+        return means.idxmin(), means.min()
+
+    def corr(self, pop_cap):
+        return pd.DataFrame(self._stats.corr(self.count(pop_cap)), index=BLOOD_GROUPS, columns=BLOOD_GROUPS)
+
+
+def build_aggregate_index(store):
+    continents = CONTINENTS + [c for c in store.continents if c not in CONTINENTS]
+    return {c: ContinentIndex(store, store.continent_positions(c)) for c in continents}
+
+
+def split_filter_part(filter_part):
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                # word operators need spaces after them in the filter string,
+                # but we don't want these later
+                return name, operator_type[0].strip(), value
+
+    return None, None, None
+
+
+def query_table(frame, page_current, page_size, sort_by=None, filter_query=None):
+    """Filter, sort and page ``frame`` the way a custom-backend DataTable expects.
+
+    Only the requested page of TABLE_COLUMNS is converted to records, so the
+    payload size depends on ``page_size`` and not on the number of matching rows.
+    """
+    if filter_query:
+        mask = np.ones(len(frame), dtype=bool)
+        for filter_part in filter_query.split(' && '):
+            col_name, operator, filter_value = split_filter_part(filter_part)
+            if col_name not in frame.columns:
+                continue
+            column = frame[col_name]
+            if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+                mask &= getattr(column, operator)(filter_value).to_numpy()
+            elif operator == 'contains':
+                mask &= column.astype(str).str.contains(str(filter_value), regex=False).to_numpy()
+            elif operator == 'datestartswith':
+                mask &= column.astype(str).str.startswith(str(filter_value)).to_numpy()
+        frame = frame[mask]
+
+    if sort_by:
+        frame = frame.sort_values(
+            [col['column_id'] for col in sort_by],
+            ascending=[col['direction'] == 'asc' for col in sort_by],
+            kind='mergesort'
+        )
+
+    page_count = max(1, math.ceil(len(frame) / page_size))
+    start = min(page_current or 0, page_count - 1) * page_size
+    return frame.iloc[start:start + page_size][TABLE_COLUMNS].to_dict('records'), page_count
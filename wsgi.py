@@ -0,0 +1,31 @@
+"""Production entry point: ``gunicorn`` (configured by gunicorn.conf.py) serves ``wsgi:server``.
+
+gunicorn.conf.py preloads this module in the master process, so the data store,
+aggregate index and warmed figure caches are built once and inherited by every
+worker; figures built later are shared between workers through the disk cache.
+"""
+import logging
+import os
+import time
+
+from app import app, background_callback_manager
+from callbacks import warm_figure_caches
+from figures import enable_shared_cache
+from layout import DEFAULT_BLOOD_TYPES
+from utils import CACHE_DIR
+
+SHARED_FIGURE_CACHE_DIR = os.path.join(CACHE_DIR, "figures")
+WARM_BLOOD_TYPES = os.environ.get("WARM_BLOOD_TYPES", ",".join(DEFAULT_BLOOD_TYPES)).split(",")
+
+logger = logging.getLogger(__name__)
+
+server = app.server
+shared_cache = enable_shared_cache(SHARED_FIGURE_CACHE_DIR)
+
+start = time.perf_counter()
+warm_figure_caches(WARM_BLOOD_TYPES)
+logger.info(f"Warmed figure caches in {time.perf_counter() - start:.1f}s")
+
+# SQLite connections must not cross a fork; diskcache reconnects lazily in each worker
+shared_cache.close()
+background_callback_manager.handle.close()